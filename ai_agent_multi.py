@@ -1,27 +1,24 @@
 import re
 import json
 import pandas as pd
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
 from datetime import datetime
-from utils import get_orders_df
-
-# Load environment variables
-load_dotenv()
-
-# Configure API Key
-API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=API_KEY)
+from utils import get_orders_df, get_buyers_df, get_sellers_df
+from tracing import Trace, activate, span, store_trace, profile_request, profiling_enabled
+from llm_backends import create_model, CassetteMiss, DEFAULT_MODEL
 
 class BaseAgent:
-    def __init__(self, model_name='gemini-3-pro-preview'):
-        self.model = genai.GenerativeModel(model_name)
+    def __init__(self, model_name=DEFAULT_MODEL, model=None):
+        # model: anything with generate_content(prompt) -> .text (see llm_backends)
+        self.model = model or create_model(model_name)
+        self.model_name = getattr(self.model, 'model_name', model_name)
 
     def generate_json(self, prompt):
         try:
-            response = self.model.generate_content(prompt)
-            text_response = response.text.strip()
+            with span("llm", model=self.model_name, prompt_chars=len(prompt)) as s:
+                response = self.model.generate_content(prompt)
+                text_response = response.text.strip()
+                if s is not None:
+                    s.attrs['response_chars'] = len(text_response)
             
             # Special case: If the response is ONLY a Python code block (for ExecutorAgent)
             if text_response.startswith('```python') and 'python_code' not in text_response:
@@ -51,15 +48,19 @@ class BaseAgent:
                     "order_id": None
                 }
                 
+        except CassetteMiss:
+            # A replayed session that asks something new must fail, not quietly degrade
+            raise
         except Exception as e:
             print(f"JSON Generation Error: {e}")
             print(f"Raw Response: {response.text if 'response' in locals() else 'None'}")
             return None
 
 class PlannerAgent(BaseAgent):
-    def __init__(self, df):
-        super().__init__()
+    def __init__(self, df, lookup_tables=None, model=None):
+        super().__init__(model=model)
         self.df = df
+        self.lookup_tables = lookup_tables or {}
         self.data_summary = self._get_data_summary()
 
     def _get_data_summary(self):
@@ -67,12 +68,22 @@ class PlannerAgent(BaseAgent):
         summary = "Columns and Data Types:\n"
         for col in self.df.columns:
             summary += f"- {col} ({self.df[col].dtype})\n"
-            if self.df[col].dtype == 'object':
+            if isinstance(self.df[col].dtype, pd.CategoricalDtype):
+                unique_vals = self.df[col].cat.categories.tolist()
+                if len(unique_vals) < 20:
+                    summary += f"  Allowed Values: {unique_vals}\n"
+                else:
+                    summary += f"  Sample Values: {unique_vals[:5]}...\n"
+            elif self.df[col].dtype == 'object':
                 unique_vals = [x for x in self.df[col].unique().tolist() if str(x) != 'nan']
                 if len(unique_vals) < 20:
                     summary += f"  Allowed Values: {unique_vals}\n"
                 else:
                     summary += f"  Sample Values: {unique_vals[:5]}...\n"
+        if self.lookup_tables:
+            summary += "Lookup Tables (joined on ID, only needed for addresses/GST/TIN):\n"
+            for name, table in self.lookup_tables.items():
+                summary += f"- {name}: {list(table.columns)}\n"
         return summary
 
     def plan(self, user_query, chat_history):
@@ -104,8 +115,8 @@ class PlannerAgent(BaseAgent):
            - Break down complex queries into logical steps.
            - **CRITICAL**: When filtering by category/product type, extract the EXACT name from the user query. For example: 'Chemical' -> 'Chemicals', 'Holography' -> 'Holography'. Cross-reference with the allowed values in DATA SCHEMA.
            - **CRITICAL**: If the user asks for a list/details, the final step MUST be to retrieve the data, not just count it.
-           - **CRITICAL**: If the user asks for "overdue" orders OR "due date passed" OR "payment pending", you MUST check `Order Status == 'Delivered'` AND `Payment Due Date < Today`.
-           - **DERIVED METRICS**: "Balance" = 'Total Amount' - 'Advance Amount'. If user asks for balance, include a step to calculate it.
+           - **CRITICAL**: If the user asks for "overdue" orders OR "due date passed" OR "payment pending", use the precomputed `Payment Overdue` column (and `Days Overdue` for aging).
+           - **DERIVED METRICS**: "Balance" ('Total Amount' - 'Advance Amount') is already a column.
         
         OUTPUT JSON FORMAT:
         {{
@@ -124,9 +135,13 @@ class PlannerAgent(BaseAgent):
         return self.generate_json(prompt)
 
 class ExecutorAgent(BaseAgent):
-    def __init__(self, df):
-        super().__init__()
+    def __init__(self, df, lookup_tables=None, model=None):
+        super().__init__(model=model)
         self.df = df
+        self.lookup_tables = lookup_tables or {}
+
+    def _lookup_tables_prompt(self):
+        return "\n".join(f"`{name}`: {list(table.columns)}" for name, table in self.lookup_tables.items())
 
     def execute_step(self, step, context):
         # Context contains results from previous steps
@@ -144,6 +159,9 @@ class ExecutorAgent(BaseAgent):
         DATAFRAME VARIABLE: `df`
         DATAFRAME COLUMNS: {list(self.df.columns)}
         
+        LOOKUP TABLES (buyer/seller details, keyed by 'Buyer ID' / 'Seller ID'):
+        {self._lookup_tables_prompt()}
+        
         CURRENT STEP:
         {json.dumps(step)}
         
@@ -155,14 +173,15 @@ class ExecutorAgent(BaseAgent):
         2. Store the result in a variable named `result`.
         3. Use `pd.to_datetime` for date comparisons.
         4. Handle case sensitivity (e.g., `str.lower()`).
-        5. **CRITICAL**: For "overdue" / "due date passed" logic: Use the CURRENT DATE provided above, NOT pd.Timestamp.now(). Example: `df[(df['Order Status'] == 'Delivered') & (pd.to_datetime(df['Payment Due Date']) < pd.Timestamp('{current_date}'))]`
+        5. **CRITICAL**: For "overdue" / "due date passed" logic, filter on the precomputed boolean column: `df[df['Payment Overdue']]`. `Days Overdue` holds whole days past the due date. Do not re-derive it from `Payment Due Date`.
         6. **MAPPINGS**: "Category"->"Order Type", "Product"->"Item", "Unit Price"->"Unit Cost".
-        7. **CALCULATIONS**: "Balance" = 'Total Amount' - 'Advance Amount'.
+        7. **CALCULATIONS**: "Balance" is precomputed as the `Balance` column ('Total Amount' - 'Advance Amount').
         8. **CONTEXT USAGE**: 
            - **INCORRECT**: `result = df[df['Col'] == 'Val']` (This ignores previous filters!)
            - **CORRECT**: `prev_df = context[1]; result = prev_df[prev_df['Col'] == 'Val']` (Always use the output of the previous step if it was a dataframe)
         9. **WARNING**: `df` is the ENTIRE dataset. Only use `df` if the step explicitly says "all orders" or "from the database". For "filtered orders", ALWAYS use `context`.
-        10. **PANDAS BEST PRACTICE**: Always use `.copy()` when filtering DataFrames to avoid SettingWithCopyWarning. Use `.loc[]` for column assignments. Example: `result = df[df['Col'] == 'Val'].copy()` then `result.loc[:, 'NewCol'] = ...`
+        10. **LOOKUPS**: Buyer/seller addresses, GST and TIN are NOT in `df`. Only when the step needs them, join e.g. `df.merge(buyers, on='Buyer ID')`.
+        11. **PANDAS BEST PRACTICE**: Always use `.copy()` when filtering DataFrames to avoid SettingWithCopyWarning. Use `.loc[]` for column assignments. Example: `result = df[df['Col'] == 'Val'].copy()` then `result.loc[:, 'NewCol'] = ...`
         
         OUTPUT JSON:
         {{
@@ -174,21 +193,24 @@ class ExecutorAgent(BaseAgent):
             return None, "Failed to generate code"
 
         code = plan['python_code']
-        local_vars = {'df': self.df, 'pd': pd, 'context': context}
+        local_vars = {'df': self.df, 'pd': pd, 'context': context, **self.lookup_tables}
         
         try:
-            exec(code, {}, local_vars)
+            with span("exec", attempt=1):
+                exec(code, {}, local_vars)
             return local_vars.get('result'), None
         except Exception as e:
             # Attempt self-correction
             print(f"Execution Error: {e}. Retrying...")
-            return self._retry_execution(step, context, code, str(e))
+            with span("retry", error=str(e)):
+                return self._retry_execution(step, context, code, str(e))
 
     def _retry_execution(self, step, context, failed_code, error_msg):
         prompt = f"""
         You are the EXECUTOR agent. Your previous Python code failed. Fix it.
         
         DATAFRAME COLUMNS: {list(self.df.columns)}
+        LOOKUP TABLES: {self._lookup_tables_prompt()}
         
         STEP: {json.dumps(step)}
         
@@ -213,10 +235,11 @@ class ExecutorAgent(BaseAgent):
             return None, f"Retry failed: {error_msg}"
 
         code = plan['python_code']
-        local_vars = {'df': self.df, 'pd': pd, 'context': context}
+        local_vars = {'df': self.df, 'pd': pd, 'context': context, **self.lookup_tables}
         
         try:
-            exec(code, {}, local_vars)
+            with span("exec", attempt=2):
+                exec(code, {}, local_vars)
             return local_vars.get('result'), None
         except Exception as e:
             return None, f"Retry failed again: {e}"
@@ -262,23 +285,46 @@ class ValidatorAgent(BaseAgent):
         return self.generate_json(prompt)
 
 class MultiAgentOrchestrator:
-    def __init__(self, data_path):
+    def __init__(self, data_path, model=None):
+        # One model backend shared by all three agents (one cassette file, one connection)
+        model = model or create_model()
         self.data_path = data_path
         self.df = get_orders_df()
-        self.planner = PlannerAgent(self.df)
-        self.executor = ExecutorAgent(self.df)
-        self.validator = ValidatorAgent()
+        self.lookup_tables = {'buyers': get_buyers_df(), 'sellers': get_sellers_df()}
+        self.planner = PlannerAgent(self.df, self.lookup_tables, model=model)
+        self.executor = ExecutorAgent(self.df, self.lookup_tables, model=model)
+        self.validator = ValidatorAgent(model=model)
         self.chat_history = []
 
-    def process_query(self, user_query, progress_callback=None):
-        if self.df.empty:
-            self.df = get_orders_df()
+    def refresh_data(self):
+        # Status, deliveries and overdue state (which moves with the clock) change after startup,
+        # so every query works on a fresh copy of the orders; the agents share it
+        self.df = get_orders_df()
+        self.planner.df = self.executor.df = self.df
+
+    def process_query(self, user_query, progress_callback=None, profile=False):
+        trace = Trace("chat", query=user_query)
+        with activate(trace), profile_request(trace, enabled=profiling_enabled(profile)):
+            result = self._process_query(user_query, progress_callback)
+        trace.finish()
+        store_trace(trace)
+
+        result["trace_id"] = trace.trace_id
+        result["trace"] = trace.to_dict()
+        return result
+
+    def _process_query(self, user_query, progress_callback=None):
+        self.refresh_data()
 
         # 1. PLAN
         if progress_callback:
             progress_callback({"stage": "planning", "message": "Analyzing your question..."})
         
-        plan_result = self.planner.plan(user_query, self.chat_history)
+        with span("planner") as s:
+            plan_result = self.planner.plan(user_query, self.chat_history)
+            if plan_result and s is not None:
+                s.attrs['type'] = plan_result.get('type')
+                s.attrs['steps'] = len(plan_result.get('plan', []))
         
         if not plan_result:
             return {"response": "I'm having trouble understanding. Could you rephrase?", "action": None}
@@ -303,7 +349,12 @@ class MultiAgentOrchestrator:
                     "total_steps": total_steps
                 })
             
-            result, error = self.executor.execute_step(step, context)
+            with span("executor.step", step_id=step.get('step_id'), description=step.get('description')) as s:
+                result, error = self._execute_step(plan_result['plan'], idx, context)
+                if s is not None:
+                    s.attrs['status'] = 'error' if error else 'ok'
+                    if error:
+                        s.attrs['error'] = error
             if error:
                 print(f"Step {step['step_id']} failed: {error}")
                 break
@@ -314,7 +365,8 @@ class MultiAgentOrchestrator:
         if progress_callback:
             progress_callback({"stage": "validating", "message": "Generating final answer..."})
         
-        final_result = self.validator.validate(user_query, plan_result['plan'], context)
+        with span("validator"):
+            final_result = self.validator.validate(user_query, plan_result['plan'], context)
         
         if not final_result:
              return {"response": "I processed the data but couldn't generate a summary. Please try again.", "action": None}
@@ -332,3 +384,7 @@ class MultiAgentOrchestrator:
             "order_id": order_id,
             "thinking": f"Plan: {json.dumps(plan_result['plan'])}\nLog: {execution_log}"
         }
+
+    def _execute_step(self, plan, idx, context):
+        # Step idx (1-based) of plan, given the results of the steps before it
+        return self.executor.execute_step(plan[idx - 1], context)
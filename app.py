@@ -1,16 +1,27 @@
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
+import argparse
 import os
 import json
 import asyncio
-from utils import get_all_orders, get_order_by_id, cancel_order, generate_invoice_pdf, load_config, get_production_timeline
+from utils import get_all_orders, get_all_orders_json, get_order_by_id, get_orders_by_ids, cancel_order, update_order_status, generate_invoice_pdf, load_config, get_production_timeline, get_dashboard_stats, get_order_store, subscribe_order_changes, get_order_history, get_stage_events, ingest_stage_events, PRODUCTION_STAGES, worker_count, WORKERS_ENV, receivables
 from ai_agent_multi import MultiAgentOrchestrator
+from tracing import get_trace
+from change_feed import ChangeFeed
+from rollups import OrderRollups
+from stage_events import STAGE_LOCATIONS
+from stage_analytics import StageAnalytics
+from order_search import OrderSearchIndex
+from receivables import OverdueScheduler, AGING_BUCKETS
+from chat_batch import run_batch, DEFAULT_LLM_CONCURRENCY, MAX_BATCH_QUERIES
+from compression import CompressionMiddleware
+from static_assets import StaticAssets
 from datetime import datetime
 import ast
 import re as regex
@@ -22,8 +33,10 @@ app = FastAPI()
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Templates
+# Templates link CSS/JS through asset_url(), which points at fingerprinted, precompressed copies
+static_assets = StaticAssets("static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = static_assets.url
 
 # CORS
 app.add_middleware(
@@ -34,6 +47,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for HTML and API responses over 1 KB; streams and precompressed assets pass through
+app.add_middleware(CompressionMiddleware)
+
+# Push changed rows to dashboards instead of having them re-poll /api/orders. This runs under
+# the store lock on every mutation, so it carries only the rows: dashboards derive their stats
+# from them, and anyone else can ask /api/dashboard-stats.
+change_feed = ChangeFeed(
+    build_payload=lambda entry: {"orders": get_orders_by_ids(entry.get("order_ids", []))},
+    current_seq=lambda: get_order_store().sequence()
+)
+subscribe_order_changes(change_feed.on_mutation)
+
+# Chart rollups, kept up to date from the same mutation events
+order_rollups = OrderRollups(get_order_store)
+subscribe_order_changes(order_rollups.on_mutation)
+
+# Server-side order search, kept in step with status changes
+order_search = OrderSearchIndex(get_order_store)
+subscribe_order_changes(order_search.on_mutation)
+
+# Tells dashboards when delivered orders go overdue, at the moment their due date passes
+overdue_scheduler = OverdueScheduler(receivables, lambda order_ids: change_feed.announce("overdue", {"order_ids": order_ids, "stats": get_dashboard_stats()}))
+subscribe_order_changes(overdue_scheduler.on_mutation)
+
+# Dwell times / WIP per production stage, cached until new stage events arrive
+stage_analytics = StageAnalytics(get_stage_events, get_order_store)
+
 # Initialize AI Agent
 DATA_PATH = os.path.join('data', 'order_db_v2.xlsx')
 ai_agent = MultiAgentOrchestrator(DATA_PATH)
@@ -46,28 +86,46 @@ class LoginRequest(BaseModel):
 class CancelRequest(BaseModel):
     reason: str
 
+class StatusUpdateRequest(BaseModel):
+    order_ids: list[str]
+    status: str
+
+class StageEvent(BaseModel):
+    order_no: str
+    stage: str
+    timestamp: str
+    location: str = None
+
+class StageEventsRequest(BaseModel):
+    events: list[StageEvent]
+
 class ChatRequest(BaseModel):
     query: str
+    profile: bool = False
+
+class BatchChatRequest(BaseModel):
+    queries: list[str]
+    llm_concurrency: int = DEFAULT_LLM_CONCURRENCY
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(request, "index.html")
 
 @app.get("/index.html", response_class=HTMLResponse)
 async def index_html(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(request, "index.html")
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return templates.TemplateResponse(request, "dashboard.html")
 
 @app.get("/dashboard.html", response_class=HTMLResponse)
 async def dashboard_html(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return templates.TemplateResponse(request, "dashboard.html")
 
 @app.get("/order_details.html", response_class=HTMLResponse)
 async def order_details_html(request: Request):
-    return templates.TemplateResponse("order_details.html", {"request": request})
+    return templates.TemplateResponse(request, "order_details.html")
 
 @app.post("/api/login")
 async def login(request: Request):
@@ -79,16 +137,52 @@ async def login(request: Request):
         return {"success": True, "redirect": "/dashboard"}
     return JSONResponse(status_code=401, content={"success": False, "message": "Invalid credentials"})
 
+@app.get("/assets/{name:path}")
+async def get_asset(name: str, request: Request):
+    asset = static_assets.response(name, request.headers.get("accept-encoding"))
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    body, headers = asset
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Type"})
+    return Response(content=body, headers=headers)
+
 @app.get("/api/orders")
-async def get_orders():
-    orders = get_all_orders()
-    return {"orders": orders}
+async def get_orders(request: Request):
+    # Pre-serialized from the typed store; avoids building one dict per order.
+    # The sequence is read first so a change feed resumed from it never misses a mutation.
+    # The ETag is taken before the body too, so it can only be older than what it labels:
+    # an unchanged store answers a reload with 304 instead of re-serializing everything.
+    store = get_order_store()
+    etag = 'W/' + store.etag()
+    seq = store.sequence()
+    headers = {"X-Order-Seq": str(seq), "ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content='{"orders":' + get_all_orders_json() + '}', media_type="application/json", headers=headers)
+
+@app.get("/api/orders/stream")
+async def stream_order_changes(request: Request, since: int = None):
+    # EventSource sends Last-Event-ID on reconnect; ?since= is used for the first connection
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = get_order_store().sequence()
+    return StreamingResponse(change_feed.stream(since), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/search")
+async def search_orders(q: str, limit: int = 20):
+    if limit < 1:
+        return JSONResponse(status_code=400, content={"success": False, "message": "limit must be positive"})
+    return order_search.search(q, min(limit, 200))
 
 @app.get("/api/order/{order_id}")
 async def get_order_details(order_id: str):
     order = get_order_by_id(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    order["timeline"] = get_production_timeline(order['Order Status'], get_order_history(order_id))
     return order
 
 @app.get("/api/track/{order_id}")
@@ -97,35 +191,18 @@ async def track_order(order_id: str):
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Dummy tracking logic based on status
     status = order['Order Status']
-    timeline = []
-    
-    steps = ["Order Placed", "Packaging", "Shipped", "Out for Delivery", "Delivered"]
-    current_step_index = -1
-    
-    if status == 'Ordered':
-        current_step_index = 0
-    elif status == 'Packaging':
-        current_step_index = 1
-    elif status == 'Shipped':
-        current_step_index = 2
-    elif status == 'Delivered':
-        current_step_index = 4
-    
-    # Add dummy locations
-    locations = ["Origin Facility", "Sorting Center", "Regional Hub", "Delivery Station", "Customer"]
-    
-    for i, step in enumerate(steps):
-        completed = i <= current_step_index
-        timeline.append({
-            "status": step,
-            "location": locations[i],
-            "completed": completed,
-            "timestamp": "2023-10-27 10:00" if completed else None # Dummy timestamp
-        })
-        
-    return {"tracking": timeline, "current_status": status}
+    timeline = get_production_timeline(status, get_order_history(order_id))
+    tracking = [
+        {
+            "status": step["stage"],
+            "location": step["location"] or STAGE_LOCATIONS.get(step["stage"]),
+            "completed": step["completed"],
+            "timestamp": step["timestamp"]
+        }
+        for step in timeline
+    ]
+    return {"tracking": tracking, "current_status": status}
 
 @app.post("/api/cancel/{order_id}")
 async def cancel_order_endpoint(order_id: str, request: Request):
@@ -136,6 +213,38 @@ async def cancel_order_endpoint(order_id: str, request: Request):
         return {"success": True, "message": "Order cancelled successfully. Refund will be processed within 30 days."}
     return JSONResponse(status_code=400, content={"success": False, "message": "Could not cancel order"})
 
+@app.post("/api/orders/status")
+async def bulk_update_status(request: StatusUpdateRequest):
+    try:
+        result = update_order_status(request.order_ids, request.status)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
+    return {"success": True, **result}
+
+@app.post("/api/stage-events")
+async def post_stage_events(request: StageEventsRequest):
+    result = ingest_stage_events(event.model_dump() for event in request.events)
+    return {"success": True, **result}
+
+@app.get("/api/stage-events")
+async def list_stage_events(stage: str, start: str = None, end: str = None, limit: int = 1000):
+    if stage not in PRODUCTION_STAGES:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"Unknown production stage: {stage}"})
+    try:
+        events = get_stage_events().by_stage(stage, start, end, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    events['timestamp'] = events['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return {"stage": stage, "events": events.to_dict('records')}
+
+@app.get("/api/stage-events/{order_id}")
+async def order_stage_events(order_id: str):
+    events = get_order_history(order_id)
+    if events.empty and not get_order_by_id(order_id):
+        raise HTTPException(status_code=404, detail="Order not found")
+    events['timestamp'] = events['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return {"order_id": order_id, "events": events[['stage', 'timestamp', 'location']].to_dict('records')}
+
 @app.get("/api/invoice/{order_id}")
 async def download_invoice(order_id: str):
     file_path = generate_invoice_pdf(order_id)
@@ -145,72 +254,40 @@ async def download_invoice(order_id: str):
     raise HTTPException(status_code=404, detail="Invoice generation failed")
 
 @app.get("/api/dashboard-stats")
-async def get_dashboard_stats():
-    orders = get_all_orders()
-    
-    # Aggregations
-    total_orders = len(orders)
-    status_counts = {}
-    total_revenue = 0
-    total_advance = 0
-    outstanding_balance = 0
-    transit_times = []
-    overdue_count = 0
-    
-    config = load_config()
-    payment_due_days = config.get("payment_due_days", 60)
-    
-    for order in orders:
-        # Status Counts
-        status = order['Order Status']
-        status_counts[status] = status_counts.get(status, 0) + 1
-        
-        # Financials
-        amount = order.get('Total Amount', 0)
-        advance = order.get('Advance Amount', 0)
-        total_revenue += amount
-        total_advance += advance
-        
-        balance = amount - advance
-        if balance > 0:
-            outstanding_balance += balance
-            
-            # Overdue Check
-            due_date_str = order.get('Payment Due Date')
-            if due_date_str:
-                try:
-                    due_date = datetime.strptime(due_date_str, "%Y-%m-%d")
-                    if due_date < datetime.now():
-                        overdue_count += 1
-                except:
-                    pass
-
-        # Transit Time (Delivered - Shipped)
-        if status == 'Delivered':
-            shipped_str = order.get('Shipped Date')
-            delivered_str = order.get('Delivered Date')
-            if shipped_str and delivered_str:
-                try:
-                    shipped = datetime.strptime(shipped_str, "%Y-%m-%d %H:%M")
-                    delivered = datetime.strptime(delivered_str, "%Y-%m-%d %H:%M")
-                    days = (delivered - shipped).days
-                    transit_times.append(days)
-                except:
-                    pass
-                    
-    avg_transit_time = sum(transit_times) / len(transit_times) if transit_times else 0
-    
-    return {
-        "total_orders": total_orders,
-        "status_counts": status_counts,
-        "financials": {
-            "revenue": total_revenue,
-            "advance": total_advance,
-            "outstanding": outstanding_balance
-        },
-        "avg_transit_time": round(avg_transit_time, 1),
-        "overdue_count": overdue_count
-    }
+async def dashboard_stats():
+    return get_dashboard_stats()
+
+@app.get("/api/rollups")
+async def get_rollups(granularity: str = "month", group: str = None, start: str = None, end: str = None,
+                      order_type: str = None, status: str = None, top: int = None):
+    try:
+        return order_rollups.query(granularity, group, start, end, order_type, status, top)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
+
+@app.get("/api/receivables")
+async def receivables_summary():
+    return receivables.summary()
+
+@app.get("/api/receivables/overdue")
+async def overdue_orders(bucket: str = None, limit: int = 100, offset: int = 0):
+    if bucket is not None and bucket not in [b[0] for b in AGING_BUCKETS]:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"Unknown aging bucket: {bucket}"})
+    if limit < 1 or offset < 0:
+        return JSONResponse(status_code=400, content={"success": False, "message": "limit must be positive and offset non-negative"})
+    return receivables.overdue_orders(bucket, min(limit, 1000), offset)
+
+@app.get("/api/stage-stats")
+async def stage_stats():
+    return stage_analytics.stage_stats()
+
+@app.get("/api/stage-stats/slowest")
+async def slowest_orders(limit: int = 20, stage: str = None):
+    if stage is not None and stage not in PRODUCTION_STAGES:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"Unknown production stage: {stage}"})
+    if limit < 1:
+        return JSONResponse(status_code=400, content={"success": False, "message": "limit must be positive"})
+    return {"orders": stage_analytics.slowest_orders(limit, stage)}
 
 @app.get("/api/config")
 async def get_config():
@@ -230,8 +307,13 @@ async def chat_endpoint(request: ChatRequest):
                 progress_queue.put(update)
             
             def run_query():
-                result_holder['result'] = ai_agent.process_query(request.query, progress_callback=progress_callback)
-                progress_queue.put(None)  # Signal completion
+                try:
+                    result_holder['result'] = ai_agent.process_query(request.query, progress_callback=progress_callback, profile=request.profile)
+                except Exception as e:
+                    # e.g. a cassette miss in replay mode; re-raised below as an error event
+                    result_holder['error'] = e
+                finally:
+                    progress_queue.put(None)  # Signal completion
             
             # Run query in background thread
             thread = threading.Thread(target=run_query)
@@ -246,10 +328,12 @@ async def chat_endpoint(request: ChatRequest):
             
             # Wait for thread to complete
             thread.join()
+            if 'error' in result_holder:
+                raise result_holder['error']
             
             # Stream final result
             result = result_holder.get('result', {})
-            yield f"data: {json.dumps({'type': 'complete', **result})}\n\n"
+            yield f"data: {json.dumps({'type': 'complete', **result}, default=str)}\n\n"
             
         except Exception as e:
             import traceback
@@ -259,5 +343,59 @@ async def chat_endpoint(request: ChatRequest):
     
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
+@app.post("/api/chat/batch")
+async def batch_chat_endpoint(request: BatchChatRequest):
+    # Independent queries (no shared chat history), answered together in one JSON document
+    if not request.queries or len(request.queries) > MAX_BATCH_QUERIES:
+        return JSONResponse(status_code=400, content={"success": False, "message": f"Send between 1 and {MAX_BATCH_QUERIES} queries"})
+    if request.llm_concurrency < 1:
+        return JSONResponse(status_code=400, content={"success": False, "message": "llm_concurrency must be positive"})
+    result = await asyncio.to_thread(run_batch, ai_agent, request.queries, llm_concurrency=request.llm_concurrency)
+    return Response(content=json.dumps(result, default=str), media_type="application/json")
+
+@app.get("/api/trace/{trace_id}")
+async def get_chat_trace(trace_id: str, format: str = "json"):
+    trace = get_trace(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    if format == "chrome":
+        return JSONResponse(content=trace.to_chrome_trace(), headers={"Content-Disposition": f"attachment; filename=trace_{trace_id}.json"})
+    data = trace.to_dict()
+    data["summary"] = trace.summary()
+    return data
+
+@app.get("/api/trace/{trace_id}/profile")
+async def get_chat_profile(trace_id: str):
+    trace = get_trace(trace_id)
+    path = trace.attrs.get('profile_path') if trace else None
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No profile recorded for this trace")
+    return FileResponse(path=path, filename=os.path.basename(path))
+
+@app.on_event("startup")
+def start_background_threads():
+    # With several workers, mutations made by the others arrive through the shared journal
+    if worker_count() > 1:
+        get_order_store().watch()
+    overdue_scheduler.start()
+
+@app.on_event("shutdown")
+def flush_order_store():
+    # Fold any journaled mutations into the order table before exiting
+    get_order_store().compact()
+
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Order Tracking Portal server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes; more than one runs without auto-reload")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Parse the order table once here and publish the memory-mapped snapshot,
+        # so each worker maps it instead of re-reading the workbook
+        os.environ[WORKERS_ENV] = str(args.workers)
+        get_order_store().frame
+        uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("app:app", host=args.host, port=args.port, reload=True)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+HEARTBEAT_SECONDS = 15
+MAX_BUFFERED_EVENTS = 1000
+
+
+class ChangeFeed:
+    # Fans order-store mutations out to Server-Sent Events clients.
+    # Each mutation is turned into one pre-serialized SSE frame; every connected client
+    # shares that frame and a single wake-up future, so publishing costs the same
+    # for 10 or 1,000 open tabs.
+
+    def __init__(self, build_payload, current_seq, max_events=MAX_BUFFERED_EVENTS):
+        self.build_payload = build_payload
+        self.current_seq = current_seq
+        self.events = deque(maxlen=max_events)
+        self.seq = 0
+        self.notices = deque(maxlen=max_events)
+        self.notice_seq = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._waiter = None
+
+    def bind_loop(self, loop):
+        if self._loop is not loop:
+            self._loop = loop
+            self._waiter = loop.create_future()
+
+    def on_mutation(self, entry):
+        # Called from whichever thread applied the mutation
+        if entry["op"] == "reload":
+            # The store reloaded from disk (another worker compacted); clients refetch everything
+            frame = f"id: {entry['seq']}\nevent: reset\ndata: {json.dumps({'seq': entry['seq']})}\n\n"
+        else:
+            payload = {"seq": entry["seq"], "op": entry["op"], **self.build_payload(entry)}
+            frame = f"id: {entry['seq']}\nevent: orders\ndata: {json.dumps(payload, default=str)}\n\n"
+        with self._lock:
+            self.events.append((entry["seq"], frame))
+            self.seq = entry["seq"]
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def announce(self, event, payload):
+        # Notices that aren't store mutations (e.g. orders going overdue as time passes).
+        # They carry no event id, so a reconnecting client still resumes from the last
+        # mutation; clients that were disconnected at the time just miss them.
+        frame = f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+        with self._lock:
+            self.notice_seq += 1
+            self.notices.append((self.notice_seq, frame))
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        waiter, self._waiter = self._waiter, self._loop.create_future()
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def frames_since(self, seq):
+        # Returns (frames, latest seq). Frames is None when the client is too far behind
+        # (or ahead, after a restart) and must reload the full order list.
+        with self._lock:
+            if seq > self.seq:
+                return None, self.seq
+            if seq == self.seq:
+                return [], seq
+            if not self.events or self.events[0][0] > seq + 1:
+                return None, self.seq
+            return [frame for event_seq, frame in self.events if event_seq > seq], self.seq
+
+    def notices_since(self, notice_seq):
+        with self._lock:
+            return [frame for seq, frame in self.notices if seq > notice_seq], self.notice_seq
+
+    async def stream(self, since):
+        self.bind_loop(asyncio.get_running_loop())
+        with self._lock:
+            # The store's sequence survives restarts (it is journaled); the buffer doesn't
+            self.seq = max(self.seq, self.current_seq())
+            last_notice = self.notice_seq
+        yield "retry: 3000\n\n"
+        last_seq = since
+        while True:
+            waiter = self._waiter
+            frames, latest = self.frames_since(last_seq)
+            notices, last_notice = self.notices_since(last_notice)
+            last_seq = latest
+            if frames is None:
+                yield f"id: {latest}\nevent: reset\ndata: {json.dumps({'seq': latest})}\n\n"
+                continue
+            if frames or notices:
+                yield ''.join(frames + notices)
+                continue
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
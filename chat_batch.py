@@ -0,0 +1,132 @@
+import copy
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ai_agent_multi import MultiAgentOrchestrator
+from tracing import span
+
+DEFAULT_WORKERS = 8
+DEFAULT_LLM_CONCURRENCY = 4
+MAX_BATCH_QUERIES = 100
+
+
+class BoundedModel:
+    # Shares one semaphore between the planner, executor and validator models of a batch,
+    # so however many queries run at once, at most N LLM calls are in flight
+
+    def __init__(self, model, semaphore):
+        self.model = model
+        self.semaphore = semaphore
+
+    def generate_content(self, prompt):
+        with span("llm.wait"):
+            self.semaphore.acquire()
+        try:
+            return self.model.generate_content(prompt)
+        finally:
+            self.semaphore.release()
+
+
+def _own_copy(value):
+    # Step results are (result, error) tuples; the frame inside is what a later step may modify
+    if isinstance(value, tuple):
+        return tuple(_own_copy(item) for item in value)
+    return value.copy() if hasattr(value, 'copy') else value
+
+
+class StepCache:
+    # Plan step results shared across the queries of a batch. A step's result depends on
+    # the step and on everything before it, so the key is the plan up to and including it.
+    # The first query to reach a step runs it; the others wait for that result. Every query
+    # gets its own copy of it, since later steps may modify a frame in place.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.hits = 0
+
+    def run(self, key, compute):
+        # Returns (value, whether it was reused)
+        with self._lock:
+            future = self._futures.get(key)
+            reused = future is not None
+            if reused:
+                self.hits += 1
+            else:
+                future = self._futures[key] = Future()
+        if not reused:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                future.set_exception(e)
+        return _own_copy(future.result()), reused
+
+
+class BatchSession(MultiAgentOrchestrator):
+    # One query of a batch: the template orchestrator's agents and dataset, its own chat
+    # history, and plan steps routed through the batch's step cache
+
+    def __init__(self, template, step_cache):
+        self.__dict__.update(template.__dict__)
+        self.chat_history = []
+        self.step_cache = step_cache
+        self.steps_reused = 0
+
+    def refresh_data(self):
+        # The queries of a batch share one snapshot (and step results computed from it),
+        # taken when the batch starts
+        pass
+
+    def _execute_step(self, plan, idx, context):
+        key = json.dumps(plan[:idx], sort_keys=True, default=str)
+        result, reused = self.step_cache.run(key, lambda: super(BatchSession, self)._execute_step(plan, idx, context))
+        self.steps_reused += reused
+        return result
+
+
+def run_batch(agent, queries, workers=DEFAULT_WORKERS, llm_concurrency=DEFAULT_LLM_CONCURRENCY):
+    # Runs queries concurrently against one fresh snapshot of the orders. The agent itself is
+    # not modified: its sub-agents are copied with rate-limited models.
+    started = time.perf_counter()
+    semaphore = threading.BoundedSemaphore(llm_concurrency)
+    template = copy.copy(agent)
+    for name in ('planner', 'executor', 'validator'):
+        sub_agent = copy.copy(getattr(agent, name))
+        sub_agent.model = BoundedModel(sub_agent.model, semaphore)
+        setattr(template, name, sub_agent)
+    template.refresh_data()
+    step_cache = StepCache()
+
+    def run_one(query):
+        query_started = time.perf_counter()
+        session = BatchSession(template, step_cache)
+        try:
+            result = session.process_query(query)
+        except Exception as e:
+            print(f"Batch query failed: {query!r}: {e}")
+            result = {"response": None, "action": None, "error": str(e)}
+        trace = result.pop("trace", None)
+        spans = trace["spans"][1:] if trace else []
+        result["query"] = query
+        result["timings"] = {
+            "total_ms": round((time.perf_counter() - query_started) * 1000, 1),
+            # llm_ms includes llm_wait_ms, the time spent queued behind the concurrency limit
+            "llm_ms": round(sum(s["duration_ms"] for s in spans if s["name"] == "llm"), 1),
+            "llm_wait_ms": round(sum(s["duration_ms"] for s in spans if s["name"] == "llm.wait"), 1),
+            "llm_calls": sum(1 for s in spans if s["name"] == "llm"),
+            "steps_reused": session.steps_reused
+        }
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(queries)))) as pool:
+        results = list(pool.map(run_one, queries))
+
+    return {
+        "queries": len(queries),
+        "llm_concurrency": llm_concurrency,
+        "steps_deduplicated": step_cache.hits,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results
+    }
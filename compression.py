@@ -0,0 +1,97 @@
+import gzip
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it everything is served gzip-only
+    brotli = None
+
+# Bodies smaller than this aren't worth the CPU or the extra header bytes
+MINIMUM_SIZE = 1024
+# Above this, compressing would stall the event loop, so it runs in the threadpool
+THREADPOOL_SIZE = 256 * 1024
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+# Per-response compression trades ratio for speed; static assets are precompressed at max levels
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(accept_encoding):
+    # Best encoding the client accepts: br, then gzip, else None
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    # mtime=0 keeps the output deterministic for identical input
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    # Compresses complete response bodies (HTML, JSON, CSS/JS) with brotli or gzip, whichever
+    # the client prefers. Streamed responses (SSE, file downloads) and bodies that are small
+    # or already encoded go out untouched, so event streams are never held back in a buffer.
+
+    def __init__(self, app, minimum_size=MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                # Held back until the first body chunk shows whether this is a stream
+                start = message
+                return
+            if message['type'] != 'http.response.body' or start is None:
+                await send(message)
+                return
+
+            start_message, start = start, None
+            headers = MutableHeaders(raw=start_message['headers'])
+            body = message.get('body', b'')
+            if (message.get('more_body') or 'content-encoding' in headers
+                    or len(body) < self.minimum_size or not is_compressible(headers.get('content-type', ''))):
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) > THREADPOOL_SIZE:
+                body = await run_in_threadpool(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers['content-encoding'] = encoding
+            headers['content-length'] = str(len(body))
+            headers.add_vary_header('Accept-Encoding')
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_compressed)
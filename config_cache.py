@@ -0,0 +1,51 @@
+import copy
+import json
+import os
+import threading
+import time
+
+# How often the file's mtime is checked; reads in between are served from memory
+CHECK_INTERVAL = 1.0
+
+
+class ConfigCache:
+    # config.json, parsed once and re-read only when the file changes on disk, so edits
+    # take effect without a restart and hot paths don't hit the disk per call.
+    # version is bumped on every change, for caches derived from config values.
+    # Callers get their own copy, so one that edits it (or a response built from it)
+    # can't change the config everyone else sees.
+
+    def __init__(self, path, defaults, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.defaults = defaults
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._config = None
+        self._mtime = None
+        self._checked = 0
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return dict(self.defaults)
+        try:
+            with open(self.path, 'r') as f:
+                return {**self.defaults, **json.load(f)}
+        except (OSError, ValueError) as e:
+            # Keep serving the last good config while the file is half-written or invalid
+            print(f"Error reading {self.path}: {e}")
+            return self._config if self._config is not None else dict(self.defaults)
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._config is None or now - self._checked >= self.check_interval:
+                self._checked = now
+                mtime = os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+                if self._config is None or mtime != self._mtime:
+                    self._mtime = mtime
+                    config = self._read()
+                    if config != self._config:
+                        self._config = config
+                        self.version += 1
+            return copy.deepcopy(self._config)
@@ -0,0 +1,35 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: only threads of this process are serialized there
+    fcntl = None
+
+
+class FileLock:
+    # Exclusive lock held across threads and processes (flock on a sidecar file).
+    # Re-entrant within a thread, so a locked section can call other locked methods.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
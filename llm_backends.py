@@ -0,0 +1,190 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_MODEL = 'gemini-3-pro-preview'
+# LLM_BACKEND=gemini|stub picks the model; LLM_CASSETTE=path records or replays its answers
+BACKEND_ENV = 'LLM_BACKEND'
+CASSETTE_ENV = 'LLM_CASSETTE'
+CASSETTE_MODE_ENV = 'LLM_CASSETTE_MODE'
+STUB_LATENCY_ENV = 'LLM_STUB_LATENCY_MS'
+
+# Prompts embed today's date; replaying a cassette on another day should still match
+DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class ModelResponse:
+    # The one attribute of a Gemini response the agents use
+    def __init__(self, text):
+        self.text = text
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+class GeminiBackend:
+    # Google Gemini. The SDK is imported and configured on first use, so importing the
+    # agents needs neither the package nor an API key.
+
+    def __init__(self, model_name=DEFAULT_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model.generate_content(prompt)
+
+
+class StubBackend:
+    # Deterministic offline stand-in: reads the agent prompts and answers with plans, pandas
+    # code and summaries that really run against the order frame. Covers status filters,
+    # overdue, counts and lists; good enough to exercise and profile everything around the LLM.
+    # latency_ms emulates the model's response time for load tests.
+
+    def __init__(self, latency_ms=0):
+        self.model_name = 'stub'
+        self.latency_ms = latency_ms
+
+    def generate_content(self, prompt):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if 'PLANNER agent' in prompt:
+            answer = self._plan(prompt)
+        elif 'EXECUTOR agent' in prompt:
+            answer = self._code(prompt)
+        else:
+            answer = self._summary(prompt)
+        return ModelResponse(json.dumps(answer))
+
+    def _plan(self, prompt):
+        match = re.search(r'USER QUERY: "(.*)"', prompt)
+        query = match.group(1).lower() if match else ''
+        steps = []
+        for status in self._statuses(prompt):
+            if status.lower() in query:
+                steps.append(f"Filter orders where Order Status is '{status}'")
+                break
+        if 'overdue' in query:
+            steps.append("Filter overdue orders")
+        count = any(word in query for word in ('how many', 'count', 'number of'))
+        if not steps and not count and not any(word in query for word in ('order', 'list', 'show')):
+            return {"type": "out_of_scope", "response_text": "I can only help with questions about orders."}
+        steps.append("Count the orders" if count else "List the orders")
+        return {
+            "type": "data_query",
+            "plan": [
+                {"step_id": i, "description": description, "expected_output": "number" if description.startswith("Count") else "dataframe"}
+                for i, description in enumerate(steps, 1)
+            ]
+        }
+
+    def _statuses(self, prompt):
+        # Allowed values listed for Order Status in the planner's schema summary
+        match = re.search(r"- Order Status \(.*?\)\n\s*Allowed Values: (\[.*?\])", prompt)
+        if not match:
+            return []
+        try:
+            return ast.literal_eval(match.group(1))
+        except (ValueError, SyntaxError):
+            return []
+
+    def _code(self, prompt):
+        match = re.search(r'(?:CURRENT STEP|STEP):\s*(\{.*?\})\s*\n', prompt)
+        step = json.loads(match.group(1)) if match else {}
+        description = step.get('description', '')
+        step_id = step.get('step_id', 1)
+        # Each step works on the previous step's frame, the first one on the whole dataset
+        source = f"context[{step_id - 1}]" if step_id > 1 else "df"
+        status = re.search(r"Order Status is '(.*)'", description)
+        if status:
+            code = f"result = {source}[{source}['Order Status'] == {status.group(1)!r}].copy()"
+        elif description == "Filter overdue orders":
+            code = f"result = {source}[{source}['Payment Overdue']].copy()"
+        elif description == "Count the orders":
+            code = f"result = len({source})"
+        else:
+            code = f"result = {source}.head(20)"
+        return {"python_code": code}
+
+    def _summary(self, prompt):
+        match = re.search(r'PLAN & RESULTS:\s*(\{.*\})\s*INSTRUCTIONS', prompt, re.DOTALL)
+        results = json.loads(match.group(1)) if match else {}
+        last = list(results.values())[-1] if results else "No results."
+        return {"final_response": str(last).split('\n')[0], "action": None, "order_id": None}
+
+
+class CassetteBackend:
+    # Record mode passes prompts to another backend and appends each answer to a JSON-lines
+    # cassette; replay mode answers from the cassette alone, so a recorded session can be
+    # re-run offline, byte for byte. Prompts are matched with dates and whitespace normalized.
+
+    def __init__(self, path, mode='replay', inner=None):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == 'record' and inner is None:
+            raise ValueError("Record mode needs a backend to record")
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.model_name = getattr(inner, 'model_name', 'cassette')
+        self._lock = threading.Lock()
+        self._answers = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._answers[entry['key']] = entry['response']
+
+    @staticmethod
+    def key(prompt):
+        normalized = WHITESPACE_RE.sub(' ', DATE_RE.sub('<date>', prompt)).strip()
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def generate_content(self, prompt):
+        key = self.key(prompt)
+        if self.mode == 'replay':
+            with self._lock:
+                if key not in self._answers:
+                    raise CassetteMiss(f"No recorded answer in {self.path} for prompt {key[:12]}")
+                return ModelResponse(self._answers[key])
+
+        text = self.inner.generate_content(prompt).text
+        entry = {"key": key, "model": self.model_name, "prompt": prompt, "response": text}
+        with self._lock:
+            self._answers[key] = text
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        return ModelResponse(text)
+
+
+def create_model(model_name=DEFAULT_MODEL):
+    # Backend picked from the environment, wrapped in a cassette when one is configured
+    backend = os.getenv(BACKEND_ENV, 'gemini')
+    if backend == 'stub':
+        model = StubBackend(latency_ms=float(os.getenv(STUB_LATENCY_ENV, '0')))
+    elif backend == 'gemini':
+        model = GeminiBackend(model_name)
+    else:
+        raise ValueError(f"Unknown {BACKEND_ENV}: {backend}")
+    cassette = os.getenv(CASSETTE_ENV)
+    if cassette:
+        mode = os.getenv(CASSETTE_MODE_ENV, 'replay')
+        model = CassetteBackend(cassette, mode, inner=model)
+    return model
@@ -0,0 +1,97 @@
+import json
+import os
+
+from file_lock import FileLock
+
+
+class MutationLog:
+    # Append-only JSON-lines journal. Every append is fsynced before it returns,
+    # so an acknowledged mutation survives a crash even if the main table wasn't rewritten yet.
+    # Appends and rewrites hold a cross-process lock, so several workers can share one journal.
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(path + '.lock')
+
+    def append(self, entries):
+        # Returns the file size after the append (the offset a reader has consumed up to)
+        if not entries:
+            return None
+        data = ''.join(json.dumps(entry, default=str) + '\n' for entry in entries)
+        with self.lock:
+            self._drop_torn_tail()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                return f.tell()
+
+    def _drop_torn_tail(self):
+        # A crash mid-append leaves a line without its newline; appending onto it would glue
+        # the next (acknowledged) entry to the fragment and lose it on replay. Called under the lock.
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            # Walk back to the last complete line
+            end = size
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            print(f"Dropping torn journal entry at the end of {self.path}")
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read(self):
+        return self.read_from(0)[0]
+
+    def read_from(self, offset):
+        # Entries appended after byte offset, and the offset they end at. Lock-free: only
+        # newline-terminated lines are consumed, so an append in progress is picked up next time.
+        if not os.path.exists(self.path):
+            return [], 0
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        entries = []
+        for line in data[:end].decode('utf-8').splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn last line from a crash mid-append was never acknowledged
+                print(f"Skipping corrupt journal entry in {self.path}")
+        return entries, offset + end
+
+    def stamp(self):
+        # Cheap change signal for other processes: (inode, size). The inode changes on rewrite.
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    def rewrite(self, entries):
+        # Atomically replace the journal, e.g. with a checkpoint plus entries newer than a compaction
+        tmp_path = self.path + '.tmp'
+        with self.lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
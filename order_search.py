@@ -0,0 +1,434 @@
+import bisect
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Low-cardinality text, matched word by word: exact, prefix, substring and typo-tolerant
+TEXT_FIELDS = ['Buyer Name', 'Buyer GST', 'Seller Name', 'Seller TIN', 'Item', 'Order Type', 'Structure', 'Carrier', 'Order Status']
+# One value per order (or close to it), matched by prefix; Order No also by any fragment
+ID_FIELDS = ['Order No', 'Customer Ref', 'AWB']
+FRAGMENT_FIELDS = ['Order No']
+# Status changes with every mutation, so its rows are found by scanning codes rather than a sorted index
+MUTABLE_FIELDS = ['Order Status']
+PARTY_FIELDS = ['Buyer Name', 'Buyer GST', 'Seller Name', 'Seller TIN']
+RESULT_COLUMNS = ['Order No', 'Order Date', 'Order Status', 'Buyer Name', 'Item', 'Total Amount']
+SCORES = {'exact': 4.0, 'word': 3.0, 'prefix': 2.0, 'substring': 1.5, 'typo': 1.0}
+# Fragments whose rarest trigram is this common (e.g. "ORD") are left to the prefix match
+MAX_FRAGMENT_CANDIDATES = 200000
+# Below this many candidates, checking the fragment directly beats intersecting more postings
+VERIFY_CANDIDATES = 2000
+MAX_TOKENS = 8
+SCAN_CHUNK = 65536
+# Matches covering more than 1/DENSE_FRACTION of the rows are scored over the row codes: by
+# comparing them with each matched value when there are at most COMPARE_VALUES, else through a lookup
+DENSE_FRACTION = 8
+COMPARE_VALUES = 4
+# With at most this many matching rows, results are picked by sorting them all
+SORT_CANDIDATES = 4096
+WORD_RE = re.compile(r'[0-9a-z]+')
+# What a build produces; swapped into the live index in one go
+BUILT_ATTRIBUTES = ['size', 'fields', 'words', 'sorted_words', 'word_bigrams', 'sorted_ids', 'trigrams']
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance, cut off at limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _bigrams(word):
+    return {word[i:i + 2] for i in range(len(word) - 1)}
+
+
+def _code_dtype(count):
+    # Narrowest signed type for codes 0..count-1 and -1; narrow codes compare faster
+    for dtype in ('int8', 'int16'):
+        if count <= np.iinfo(dtype).max:
+            return dtype
+    return 'int32'
+
+
+class _Field:
+    # Distinct values of one column and, per value, the rows that hold it (sorted permutation + offsets)
+
+    def __init__(self, name, series, indexed=True):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = np.asarray(series.array.codes)
+            values = series.cat.categories
+        else:
+            codes, values = pd.factorize(series)
+        codes = codes.astype(_code_dtype(len(values)))
+        self.name = name
+        self.values = [str(v) for v in np.asarray(values, dtype=object).tolist()]
+        self.lower = [v.lower() for v in self.values]
+        self.codes = codes
+        # Every row has a value, so matching all the values matches all the rows
+        self.complete = not (codes < 0).any()
+        self.indexed = indexed
+        if indexed:
+            self.order = np.argsort(codes, kind='stable')
+            self.offsets = np.searchsorted(codes[self.order], np.arange(len(self.values) + 1))
+
+    def rows(self, value_ids):
+        value_ids = np.asarray(value_ids, dtype='int64')
+        if not len(value_ids):
+            return np.empty(0, dtype='int64')
+        if not self.indexed:
+            mask = self.codes == value_ids[0]
+            for value_id in value_ids[1:]:
+                mask |= self.codes == value_id
+            return np.flatnonzero(mask)
+        starts = self.offsets[value_ids]
+        lengths = self.offsets[value_ids + 1] - starts
+        # Gather all the slices at once: position k of slice i is starts[i] + k
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return self.order[shift + np.arange(lengths.sum())]
+
+    def row_count(self, value_ids):
+        return int((self.offsets[value_ids + 1] - self.offsets[value_ids]).sum())
+
+    def add_value(self, value):
+        self.values.append(value)
+        self.lower.append(value.lower())
+        if np.dtype(_code_dtype(len(self.values))).itemsize > self.codes.dtype.itemsize:
+            self.codes = self.codes.astype(_code_dtype(len(self.values)))
+        return len(self.values) - 1
+
+
+class OrderSearchIndex:
+    # In-memory search over the order text columns. Text columns have few distinct values,
+    # so matching (including typo tolerance) runs over that small vocabulary and is then
+    # expanded to rows; identifier columns use sorted values for prefixes and a trigram
+    # index for fragments. Per-row scores are combined in dense arrays, one per query token.
+    # Status changes are patched in place; a store reload rebuilds the index. Builds work
+    # from a snapshot of the frame outside the store lock, so mutations carry on meanwhile,
+    # and the finished index is swapped in whole.
+
+    def __init__(self, get_store):
+        self.get_store = get_store
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._generation = None
+        self._store_id = None
+        # Status changes made while a build is running, replayed onto the new index
+        self._pending = None
+        self.fields = {}
+
+    def _stale(self, store):
+        return self._store_id != id(store) or self._generation != store.generation
+
+    def _build(self, df):
+        self.size = len(df)
+        self.fields = {}
+        for name in TEXT_FIELDS + ID_FIELDS:
+            if name in df.columns:
+                self.fields[name] = _Field(name, df[name], indexed=name not in MUTABLE_FIELDS)
+
+        # Word vocabulary over all text fields: word -> [(field, value id)]
+        self.words = {}
+        for name in TEXT_FIELDS:
+            if name in self.fields:
+                for value_id in range(len(self.fields[name].values)):
+                    self._add_words(name, value_id)
+        self.sorted_words = sorted(self.words)
+        self.word_bigrams = {}
+        for word in self.words:
+            for gram in _bigrams(word):
+                self.word_bigrams.setdefault(gram, set()).add(word)
+
+        # Identifier prefixes: values sorted case-insensitively
+        self.sorted_ids = {}
+        for name in ID_FIELDS:
+            if name in self.fields:
+                # Fixed-width unicode sorts several times faster than Python strings
+                lower = np.array(self.fields[name].lower, dtype=str)
+                order = np.argsort(lower, kind='stable')
+                self.sorted_ids[name] = (lower[order], order)
+
+        self.trigrams = {name: self._build_trigrams(self.fields[name].lower) for name in FRAGMENT_FIELDS if name in self.fields}
+
+    def _add_words(self, name, value_id):
+        for word in set(WORD_RE.findall(self.fields[name].lower[value_id])):
+            self.words.setdefault(word, []).append((name, value_id))
+
+    def _build_trigrams(self, values):
+        # trigram code -> value ids, as sorted unique codes + offsets into a posting array
+        try:
+            encoded = np.array(values, dtype=str).astype('S')
+        except UnicodeEncodeError:
+            encoded = np.char.encode(np.array(values, dtype=str), 'utf-8')
+        width = encoded.dtype.itemsize
+        if width < 3:
+            return np.empty(0, 'int32'), np.zeros(1, 'int64'), np.empty(0, 'int32')
+        chars = encoded.view('uint8').reshape(len(values), width).astype('int32')
+        grams = (chars[:, :-2] << 16) | (chars[:, 1:-1] << 8) | chars[:, 2:]
+        ids = np.broadcast_to(np.arange(len(values), dtype='int32')[:, None], grams.shape)
+        valid = chars[:, 2:] != 0
+        grams, ids = grams[valid], ids[valid]
+        order = np.argsort(grams, kind='stable')
+        grams = grams[order]
+        starts = np.flatnonzero(np.r_[True, grams[1:] != grams[:-1]])
+        return grams[starts], np.append(starts, len(order)), ids[order]
+
+    def refresh(self):
+        # Brings the index up to date with the store, building a new one if it reloaded
+        store = self.get_store()
+        with self._build_lock:
+            while True:
+                with store.lock, self._lock:
+                    # Reading the frame picks up a reload by another process first
+                    store.frame
+                    if not self._stale(store):
+                        return
+                    generation = store.generation
+                    # Copy-on-write: later mutations of the store don't show through the snapshot
+                    df = store.joined(columns=PARTY_FIELDS)
+                    self._pending = []
+                built = OrderSearchIndex(self.get_store)
+                built._build(df)
+                with store.lock, self._lock:
+                    pending, self._pending = self._pending, None
+                    if store.generation != generation:
+                        # Reloaded again while building: the snapshot's rows are out of date
+                        continue
+                    for name in BUILT_ATTRIBUTES:
+                        setattr(self, name, getattr(built, name))
+                    self._store_id, self._generation = id(store), generation
+                    for entry in pending:
+                        self._set_status(store, entry)
+                    return
+
+    def on_mutation(self, entry):
+        # Store listener: keep the status column's codes in step with the store
+        if entry.get('op') != 'set_status':
+            return
+        store = self.get_store()
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(entry)
+            if not self._stale(store):
+                self._set_status(store, entry)
+
+    def _set_status(self, store, entry):
+        if 'Order Status' not in self.fields:
+            return
+        field = self.fields['Order Status']
+        status = entry['status']
+        if status in field.values:
+            value_id = field.values.index(status)
+        else:
+            value_id = field.add_value(status)
+            self._add_words('Order Status', value_id)
+            for word in WORD_RE.findall(status.lower()):
+                if word not in self.sorted_words:
+                    bisect.insort(self.sorted_words, word)
+                for gram in _bigrams(word):
+                    self.word_bigrams.setdefault(gram, set()).add(word)
+        positions = store.positions(entry['order_ids'])
+        field.codes[positions[positions >= 0]] = value_id
+
+    def _text_matches(self, token):
+        # {(field, value id): score} over the text vocabulary
+        best = {}
+
+        def hit(name, value_id, score):
+            if score > best.get((name, value_id), 0):
+                best[(name, value_id)] = score
+
+        words = WORD_RE.findall(token)
+        if len(words) == 1 and words[0] == token:
+            for name, value_id in self.words.get(token, []):
+                exact = self.fields[name].lower[value_id] == token
+                hit(name, value_id, SCORES['exact'] if exact else SCORES['word'])
+            start = bisect.bisect_left(self.sorted_words, token)
+            for word in self.sorted_words[start:]:
+                if not word.startswith(token):
+                    break
+                for name, value_id in self.words.get(word, []):
+                    hit(name, value_id, SCORES['prefix'])
+            if len(token) >= 4:
+                limit = 1 if len(token) <= 6 else 2
+                candidates = set()
+                for gram in _bigrams(token):
+                    candidates |= self.word_bigrams.get(gram, set())
+                for word in candidates:
+                    if abs(len(word) - len(token)) <= limit and edit_distance(token, word, limit) <= limit:
+                        for name, value_id in self.words[word]:
+                            hit(name, value_id, SCORES['typo'])
+        if len(token) >= 3:
+            for name in TEXT_FIELDS:
+                if name in self.fields:
+                    for value_id, value in enumerate(self.fields[name].lower):
+                        if token in value:
+                            hit(name, value_id, SCORES['substring'])
+        return best
+
+    def _id_matches(self, name, token):
+        # [(value ids, score)] for prefix and fragment matches on an identifier column
+        matches = []
+        values, order = self.sorted_ids[name]
+        lo = np.searchsorted(values, token, side='left')
+        hi = np.searchsorted(values, token + '\uffff', side='right')
+        if hi > lo:
+            ids = order[lo:hi]
+            exact = values[lo] == token
+            if exact:
+                matches.append((ids[:1], SCORES['exact']))
+                ids = ids[1:]
+            matches.append((ids, SCORES['prefix']))
+
+        if name in self.trigrams and len(token) >= 3:
+            keys, offsets, postings = self.trigrams[name]
+            raw = token.encode('utf-8')
+            lists = []
+            for i in range(len(raw) - 2):
+                code = (raw[i] << 16) | (raw[i + 1] << 8) | raw[i + 2]
+                pos = np.searchsorted(keys, code)
+                if pos >= len(keys) or keys[pos] != code:
+                    return matches
+                lists.append(postings[offsets[pos]:offsets[pos + 1]])
+            lists.sort(key=len)
+            if len(lists[0]) > MAX_FRAGMENT_CANDIDATES:
+                return matches
+            # Postings are sorted, so intersecting is a binary search of the short list in the long one
+            ids = lists[0]
+            for other in lists[1:]:
+                if len(ids) <= VERIFY_CANDIDATES:
+                    break
+                pos = np.minimum(np.searchsorted(other, ids), len(other) - 1)
+                ids = ids[other[pos] == ids]
+            if len(lists) > 1:
+                # Shared trigrams don't guarantee the fragment itself; check the few candidates
+                lower = self.fields[name].lower
+                ids = np.array([i for i in ids if token in lower[i]], dtype='int64')
+            matches.append((ids, SCORES['substring']))
+        return matches
+
+    def _last_rows(self, total, level, k):
+        # Positions of the last k rows scoring exactly `level`, scanning back in chunks
+        found, end = [], len(total)
+        while end > 0 and k > 0:
+            begin = max(0, end - SCAN_CHUNK)
+            rows = np.flatnonzero(total[begin:end] == level)[::-1][:k] + begin
+            found.extend(rows.tolist())
+            k -= len(rows)
+            end = begin
+        return found
+
+    def _records(self, frame, top):
+        # Result rows straight from the index's columns; pandas per-row formatting costs more than the search
+        dates = frame['Order Date'].to_numpy()[top] if 'Order Date' in frame.columns else [None] * len(top)
+        amounts = frame['Total Amount'].to_numpy()[top] if 'Total Amount' in frame.columns else [None] * len(top)
+        records = []
+        for i, pos in enumerate(top):
+            record = {}
+            for name in ['Order No', 'Order Status', 'Buyer Name', 'Item']:
+                field = self.fields.get(name)
+                code = field.codes[pos] if field is not None else -1
+                record[name] = field.values[code] if code >= 0 else ''
+            record['Order Date'] = pd.Timestamp(dates[i]).strftime('%Y-%m-%d') if pd.notna(dates[i]) else ''
+            record['Total Amount'] = amounts[i].item() if hasattr(amounts[i], 'item') else amounts[i]
+            records.append({c: record[c] for c in RESULT_COLUMNS})
+        return records
+
+    def _token_scores(self, token):
+        # Best score per row for this token, across all fields. Scores are kept as small
+        # integers (half points) so the per-row arrays are one byte wide.
+        matches = {}
+        for (name, value_id), s in self._text_matches(token).items():
+            matches.setdefault(name, {}).setdefault(s, []).append(value_id)
+        matches = {name: [(np.asarray(ids, dtype='int64'), s) for s, ids in by_score.items()] for name, by_score in matches.items()}
+        for name in self.sorted_ids:
+            matches.setdefault(name, []).extend((np.asarray(ids, dtype='int64'), s) for ids, s in self._id_matches(name, token) if len(ids))
+
+        score = np.zeros(self.size, dtype='uint8')
+        for name, groups in matches.items():
+            field = self.fields[name]
+            broad = self.size // DENSE_FRACTION
+            if (field.indexed and sum(len(ids) for ids, s in groups) < broad
+                    and sum(field.row_count(ids) for ids, s in groups) < broad):
+                for ids, s in groups:
+                    rows = field.rows(ids)
+                    score[rows] = np.maximum(score[rows], int(s * 2))
+            elif len(groups) == 1 and len(groups[0][0]) == len(field.values) and field.complete:
+                # e.g. "ord", a prefix of every order number
+                np.maximum(score, np.uint8(groups[0][1] * 2), out=score)
+            elif sum(len(ids) for ids, s in groups) <= COMPARE_VALUES:
+                # Broad matches on a few values (e.g. one buyer on a third of the orders):
+                # comparing the row codes is several times cheaper than gathering rows
+                for ids, s in groups:
+                    for value_id in ids:
+                        np.maximum(score, (field.codes == value_id) * np.uint8(s * 2), out=score)
+            else:
+                # Broad matches on many values (e.g. "10" in a tenth of the order numbers):
+                # one lookup through the row codes; code -1 reads the extra zero at the end
+                lookup = np.zeros(len(field.values) + 1, dtype='uint8')
+                for ids, s in groups:
+                    lookup[ids] = np.maximum(lookup[ids], int(s * 2))
+                np.maximum(score, lookup[field.codes], out=score)
+        return score
+
+    def search(self, query, limit=20):
+        started = time.perf_counter()
+        store = self.get_store()
+        # Tokens without letters or digits (e.g. "/") can't match anything useful
+        tokens = [t for t in query.lower().split() if WORD_RE.search(t)][:MAX_TOKENS]
+        while True:
+            self.refresh()
+            # Store lock first, like the mutation listener, so rows can't move under us
+            with store.lock, self._lock:
+                frame = store.frame
+                if self._stale(store):
+                    # Reloaded since the refresh
+                    continue
+                results, scores, count = self._search(frame, tokens, limit)
+                break
+
+        for record, s in zip(results, scores):
+            record["score"] = float(s)
+        return {
+            "query": query,
+            "total": count,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+            "results": results
+        }
+
+    def _search(self, frame, tokens, limit):
+        total = np.zeros(self.size, dtype='uint8')
+        for n, token in enumerate(tokens):
+            score = self._token_scores(token)
+            # Every token has to match somewhere in the order
+            if n == 0:
+                total = score
+            else:
+                live = total > 0
+                total += score
+                total *= live & (score > 0)
+            if not total.any():
+                break
+
+        # Highest score first, newer orders (later rows) first among equals
+        count = int(np.count_nonzero(total)) if tokens else 0
+        if count <= SORT_CANDIDATES:
+            rows = np.flatnonzero(total)
+            top = rows[np.lexsort((-rows, -total[rows].astype('int64')))][:limit].tolist()
+        else:
+            top = []
+            level = int(total.max())
+            while level > 0 and len(top) < limit:
+                top.extend(self._last_rows(total, level, limit - len(top)))
+                level -= 1
+        scores = [total[pos] / 2 for pos in top]
+        return self._records(frame, top), scores, count
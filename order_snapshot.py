@@ -0,0 +1,85 @@
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Typed copy of a parsed order table, one .npy file per column. Worker processes open the
+# arrays with mmap, so numeric, date and category-code columns are shared through the page
+# cache instead of every worker parsing the workbook into its own copy. Category labels
+# and free-text columns are small or unique per row and are unpickled per process.
+
+
+def snapshot_root(path):
+    return os.path.splitext(path)[0] + '.snapshot'
+
+
+def snapshot_dir(path, stamp):
+    # stamp: mtime_ns of the table file the snapshot was parsed from
+    return os.path.join(snapshot_root(path), str(stamp))
+
+
+def write_snapshot(orders, parties, path, stamp):
+    target = snapshot_dir(path, stamp)
+    if os.path.exists(target):
+        return target
+    tmp = f"{target}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+
+    columns, labels = [], {}
+    for i, col in enumerate(orders.columns):
+        s = orders[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(tmp, f'{i}.npy'), s.array.codes)
+            labels[col] = s.cat.categories
+            columns.append({"name": col, "kind": "category"})
+        elif pd.api.types.is_datetime64_any_dtype(s) or pd.api.types.is_numeric_dtype(s):
+            np.save(os.path.join(tmp, f'{i}.npy'), s.to_numpy())
+            columns.append({"name": col, "kind": "array"})
+        else:
+            labels[col] = s.reset_index(drop=True)
+            columns.append({"name": col, "kind": "object"})
+
+    with open(os.path.join(tmp, 'labels.pkl'), 'wb') as f:
+        pickle.dump({"labels": labels, "parties": parties}, f)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({"columns": columns, "rows": len(orders)}, f)
+
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # Another process published the same snapshot first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for name in os.listdir(snapshot_root(path)):
+        if name != str(stamp) and '.tmp' not in name:
+            shutil.rmtree(os.path.join(snapshot_root(path), name), ignore_errors=True)
+    return target
+
+
+def load_snapshot(path, stamp):
+    # Returns (orders, parties, shared column names), or None if there is no snapshot for this stamp
+    directory = snapshot_dir(path, stamp)
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, 'labels.pkl'), 'rb') as f:
+            extra = pickle.load(f)
+    except (OSError, ValueError, pickle.UnpicklingError):
+        return None
+
+    data, shared = {}, set()
+    for i, spec in enumerate(meta["columns"]):
+        col = spec["name"]
+        if spec["kind"] == "object":
+            data[col] = extra["labels"][col]
+            continue
+        values = np.load(os.path.join(directory, f'{i}.npy'), mmap_mode='r')
+        if spec["kind"] == "category":
+            values = pd.Categorical.from_codes(values, categories=extra["labels"][col])
+        data[col] = pd.Series(values, copy=False)
+        shared.add(col)
+    orders = pd.DataFrame(data, copy=False)
+    return orders, extra["parties"], shared
@@ -0,0 +1,550 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from file_lock import FileLock
+from mutation_log import MutationLog
+from order_snapshot import load_snapshot, write_snapshot
+
+DATE_COLUMNS = [
+    'Order Date', 'Expected Delivery', 'Shipped Date', 'Delivered Date',
+    'Payment Due Date', 'Expected Dispatch Date'
+]
+# Dates without a time of day; rendered as plain dates, as the sheet holds them
+DATE_ONLY_COLUMNS = ['Order Date', 'Payment Due Date', 'Expected Dispatch Date']
+# Low-cardinality text columns repeat a handful of values across every row
+CATEGORY_COLUMNS = [
+    'Order Status', 'Order Type', 'Item', 'Buyer Name', 'Buyer Address', 'Buyer GST',
+    'Seller Name', 'Seller Address', 'Seller TIN', 'Structure', 'Thickness', 'Width',
+    'Carrier', 'Shipment Status'
+]
+# Quantities and whole-rupee amounts. Advance Amount carries paise, so it stays float64:
+# float32 can't represent paise above ~1 lakh.
+INT_COLUMNS = {
+    'Quantity': 'int32',
+    'Unit Cost': 'int32',
+    'Total Amount': 'int64',
+    'Credit Days': 'int16'
+}
+# Any other text column becomes categorical when it repeats this much
+AUTO_CATEGORY_RATIO = 0.5
+# Party details repeated on every order row are kept once per buyer/seller, keyed by ID
+PARTY_TABLES = {
+    'Buyer ID': ['Buyer Name', 'Buyer Address', 'Buyer GST'],
+    'Seller ID': ['Seller Name', 'Seller Address', 'Seller TIN']
+}
+PARTY_SHEETS = {'Buyer ID': 'Buyers', 'Seller ID': 'Sellers'}
+ORDERS_SHEET = 'Orders'
+# Write-behind: mutations land in the journal and are folded into the table in batches
+COMPACT_BATCH = 500
+COMPACT_INTERVAL = 30
+# How often a worker checks the shared table/journal for changes made by other workers
+WATCH_INTERVAL = 0.5
+
+
+def read_order_table(path):
+    # Large generated datasets (benchmarks) don't fit in a worksheet, so allow csv/parquet too
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_excel(path)
+
+
+def read_order_tables(path):
+    # Returns (orders, party tables). Party tables are None for a flat, denormalized file.
+    if path.endswith('.csv') or path.endswith('.parquet'):
+        return read_order_table(path), None
+    sheets = pd.read_excel(path, sheet_name=None)
+    if ORDERS_SHEET in sheets and all(name in sheets for name in PARTY_SHEETS.values()):
+        parties = {id_col: sheets[name] for id_col, name in PARTY_SHEETS.items()}
+        return sheets[ORDERS_SHEET], parties
+    return next(iter(sheets.values())), None
+
+
+def write_order_table(df, path):
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    elif path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def write_order_tables(orders, parties, path):
+    # Workbooks keep the normalized layout; csv/parquet have no sheets, so they get the joined rows
+    if path.endswith('.csv') or path.endswith('.parquet'):
+        write_order_table(join_parties(orders, parties), path)
+        return
+    with pd.ExcelWriter(path) as writer:
+        orders.to_excel(writer, sheet_name=ORDERS_SHEET, index=False)
+        for id_col, dim in parties.items():
+            dim.to_excel(writer, sheet_name=PARTY_SHEETS[id_col], index=False)
+
+
+def normalize_parties(df):
+    # Replace repeated buyer/seller columns with an ID into a deduplicated dimension table
+    parties = {}
+    for id_col, cols in PARTY_TABLES.items():
+        present = [c for c in cols if c in df.columns]
+        if not present or id_col in df.columns:
+            continue
+        codes = df.groupby(present, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        _, first_rows = np.unique(codes, return_index=True)
+        dim = df.iloc[first_rows][present].astype(object).reset_index(drop=True)
+        dim.insert(0, id_col, np.arange(1, len(dim) + 1, dtype='int32'))
+
+        position = df.columns.get_loc(present[0])
+        df = df.drop(columns=present)
+        df.insert(position, id_col, (codes + 1).astype('int32'))
+        parties[id_col] = dim
+    return df, parties
+
+
+def join_parties(df, parties, columns=None):
+    # Attach party columns as categoricals built from the small dimension tables,
+    # so the join is an integer take rather than a string copy per row
+    out = df.copy(deep=False)
+    for id_col, dim in parties.items():
+        if id_col not in df.columns:
+            continue
+        rows = pd.Index(dim[id_col]).get_indexer(df[id_col].to_numpy())
+        for col in dim.columns:
+            if col == id_col or (columns is not None and col not in columns):
+                continue
+            codes, uniques = pd.factorize(dim[col].to_numpy())
+            row_codes = np.where(rows >= 0, codes[rows], -1)
+            out[col] = pd.Categorical.from_codes(row_codes, categories=uniques)
+    return out
+
+
+def flat_columns(orders, parties):
+    # Column order of the original denormalized sheet: party columns sit where their ID is
+    columns = []
+    for col in orders.columns:
+        if col in parties:
+            columns.extend(c for c in parties[col].columns if c != col)
+        else:
+            columns.append(col)
+    return columns
+
+
+def compact_orders(df):
+    df = df.copy()
+    df.columns = [c.strip() for c in df.columns]
+
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    for col, dtype in INT_COLUMNS.items():
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        # Only downcast whole numbers; a cost like 12.75 stays float64 rather than being truncated
+        if values.notna().all() and (values % 1 == 0).all():
+            df[col] = values.astype(dtype)
+
+    for col in df.columns:
+        if col in DATE_COLUMNS or not (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])):
+            continue
+        if col in CATEGORY_COLUMNS or df[col].nunique() <= len(df) * AUTO_CATEGORY_RATIO:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+def boundary_frame(df):
+    # JSON-ready view of a typed frame: dates as strings, missing values as ''
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            fmt = '%Y-%m-%d' if col in DATE_ONLY_COLUMNS else '%Y-%m-%d %H:%M:%S'
+            out[col] = s.dt.strftime(fmt).astype(object).where(s.notna(), '')
+        elif isinstance(s.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(s):
+            out[col] = s.astype(object).where(s.notna(), '')
+        elif s.isna().any():
+            out[col] = s.astype(object).where(s.notna(), '')
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def orders_to_records(df):
+    if df.empty:
+        return []
+    return boundary_frame(df).to_dict('records')
+
+
+def orders_to_json(df):
+    if df.empty:
+        return '[]'
+    return boundary_frame(df).to_json(orient='records', date_format='iso')
+
+
+def journal_path(path):
+    return os.path.splitext(path)[0] + '.journal'
+
+
+def temp_table_path(path):
+    # Same directory and extension, so the final os.replace is atomic and the format is kept
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.tmp{os.getpid()}-{name}')
+
+
+class OrderStore:
+    # Parses the order table once and keeps a compact typed frame in memory.
+    # The file's mtime is checked on access so external rewrites are picked up.
+    # Buyer/seller details live in self.parties and are joined only on request.
+    # Mutations are applied in memory and fsynced to a journal, then compacted into the
+    # table file in the background; on load the journal is replayed over the table.
+    # Several processes can share one table: each follows the journal appended by the
+    # others, and with snapshots=True the parsed table is memory-mapped rather than re-parsed.
+
+    def __init__(self, path, compact_batch=COMPACT_BATCH, compact_interval=COMPACT_INTERVAL, snapshots=False):
+        self.path = path
+        self.compact_batch = compact_batch
+        self.compact_interval = compact_interval
+        self.snapshots = snapshots
+        self.log = MutationLog(journal_path(path))
+        self.seq = 0
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compact_file_lock = FileLock(journal_path(path) + '.compact.lock')
+        self._log_inode = None
+        self._log_offset = 0
+        self._shared_columns = set()
+        self._watcher = None
+        self._compact_timer = None
+        self._pending = 0
+        self._listeners = []
+        # Bumped on every (re)load so derived indexes know when to rebuild from scratch
+        self.generation = 0
+        self._df = None
+        self._mtime = None
+        self._positions = None
+        self.parties = {}
+        self.columns = []
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            self._df = pd.DataFrame()
+            self.parties = {}
+            self._mtime = None
+        else:
+            self._mtime = os.stat(self.path).st_mtime_ns
+            snapshot = load_snapshot(self.path, self._mtime) if self.snapshots else None
+            if snapshot is None:
+                orders, parties = read_order_tables(self.path)
+                orders = compact_orders(orders)
+                if parties is None:
+                    orders, parties = normalize_parties(orders)
+                else:
+                    parties = {id_col: dim.astype({c: object for c in dim.columns if c != id_col}) for id_col, dim in parties.items()}
+                snapshot = orders, parties, set()
+                if self.snapshots:
+                    # Publish for the other workers, and use the mapped copy here as well
+                    write_snapshot(orders, parties, self.path, self._mtime)
+                    snapshot = load_snapshot(self.path, self._mtime) or snapshot
+            self._df, self.parties, self._shared_columns = snapshot
+        self._positions = None
+        self._replay()
+        self.columns = flat_columns(self._df, self.parties)
+        self.generation += 1
+
+    def _replay(self):
+        self.seq = 0
+        self._pending = 0
+        stamp = self.log.stamp()
+        self._log_inode = stamp[0] if stamp else None
+        entries, self._log_offset = self.log.read_from(0)
+        for entry in entries:
+            self.seq = max(self.seq, entry.get('seq', 0))
+            if entry.get('op') == 'checkpoint':
+                continue
+            if not self._df.empty:
+                self._apply(entry)
+            self._pending += 1
+        if self._pending:
+            self._schedule_compaction()
+
+    def _index(self):
+        if self._positions is None:
+            self._positions = pd.Index(self._df['Order No'])
+        return self._positions
+
+    def _set_values(self, positions, column, value):
+        df = self._df
+        if column in self._shared_columns:
+            # Memory-mapped snapshot columns are read-only; this process copies one on first write
+            df[column] = df[column].copy()
+            self._shared_columns.discard(column)
+        if column not in df.columns:
+            df[column] = pd.Series(None, index=df.index, dtype=object)
+            self.columns = flat_columns(df, self.parties)
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and value not in df[column].cat.categories:
+            df[column] = df[column].cat.add_categories([value])
+        df.iloc[positions, df.columns.get_loc(column)] = value
+
+    def _apply(self, entry):
+        if entry['op'] == 'set_status':
+            positions = self._index().get_indexer(entry['order_ids'])
+            positions = positions[positions >= 0]
+            self._set_values(positions, 'Order Status', entry['status'])
+            if entry.get('reason') is not None:
+                self._set_values(positions, 'Cancellation Reason', entry['reason'])
+
+    def _fresh(self):
+        mtime = os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+        if self._df is None:
+            self._load()
+        elif mtime != self._mtime:
+            self._reload()
+        else:
+            self._follow_log()
+        return self._df
+
+    def _reload(self):
+        # The table (or journal) was rewritten by another process or by hand
+        seq = self.seq
+        self._load()
+        if self.seq != seq:
+            self._notify({"seq": self.seq, "op": "reload"})
+
+    def _follow_log(self):
+        # Apply mutations other processes appended to the shared journal since we last looked
+        stamp = self.log.stamp()
+        if stamp is None:
+            return
+        if self._log_inode is None and self._log_offset == 0:
+            self._log_inode = stamp[0]
+        elif stamp[0] != self._log_inode:
+            self._reload()
+            return
+        if stamp[1] <= self._log_offset:
+            return
+        entries, self._log_offset = self.log.read_from(self._log_offset)
+        for entry in entries:
+            if entry.get('op') == 'checkpoint' or entry.get('seq', 0) <= self.seq:
+                continue
+            self.seq = entry['seq']
+            if not self._df.empty:
+                self._apply(entry)
+            self._notify(dict(entry, replayed=True))
+
+    def _notify(self, entry):
+        for listener in self._listeners:
+            try:
+                listener(entry)
+            except Exception as e:
+                print(f"Order store listener error: {e}")
+
+    def watch(self, interval=WATCH_INTERVAL):
+        # Poll for other workers' mutations so this process's listeners (change feed,
+        # rollups) hear about them without waiting for a request to touch the store
+        if self._watcher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sequence()
+                except Exception as e:
+                    print(f"Order store watch error: {e}")
+
+        self._watcher = threading.Thread(target=run, daemon=True)
+        self._watcher.start()
+
+    @property
+    def lock(self):
+        # Held while mutating and while notifying listeners; derived indexes take it before
+        # their own lock so they see a consistent frame
+        return self._lock
+
+    @property
+    def frame(self):
+        with self._lock:
+            return self._fresh()
+
+    def sequence(self):
+        # Sequence number of the last applied mutation
+        with self._lock:
+            self._fresh()
+            return self.seq
+
+    def etag(self):
+        # Names the current contents across processes and restarts: the table file version
+        # plus the journal position replayed over it
+        with self._lock:
+            self._fresh()
+            return f'"{self._mtime}-{self.seq}"'
+
+    def party_table(self, id_col):
+        with self._lock:
+            self._fresh()
+            return self.parties.get(id_col, pd.DataFrame())
+
+    def joined(self, df=None, columns=None):
+        # Denormalized view in the original column order; `columns` limits which party fields are attached
+        with self._lock:
+            base = self._fresh() if df is None else df
+            if base.empty:
+                return base
+            out = join_parties(base, self.parties, columns)
+            if columns is None:
+                out = out[[c for c in self.columns if c in out.columns]]
+            return out
+
+    def position(self, order_id):
+        with self._lock:
+            if self._fresh().empty:
+                return None
+            try:
+                pos = self._index().get_loc(order_id)
+            except KeyError:
+                return None
+            return pos if isinstance(pos, (int, np.integer)) else None
+
+    def positions(self, order_ids):
+        # Row positions of order_ids in the frame, -1 where unknown
+        with self._lock:
+            if self._fresh().empty:
+                return np.full(len(order_ids), -1)
+            return self._index().get_indexer(list(order_ids))
+
+    def select(self, order_ids):
+        with self._lock:
+            df = self._fresh()
+            if df.empty:
+                return df
+            positions = self.positions(order_ids)
+            return df.iloc[positions[positions >= 0]]
+
+    def get(self, order_id):
+        with self._lock:
+            pos = self.position(order_id)
+            if pos is None:
+                return None
+            return orders_to_records(self.joined(self._df.iloc[[pos]]))[0]
+
+    def subscribe(self, listener):
+        # listener(entry) is called under the store lock after each mutation is applied
+        self._listeners.append(listener)
+
+    def update_status(self, order_ids, status, reason=None, skip_statuses=(), source=None):
+        # The journal lock is held from catching up with other writers until our append,
+        # so sequence numbers stay unique across processes. Listeners run after it is released,
+        # under the store lock only, so other workers' writes don't wait for them.
+        with self._lock:
+            # Catch up (and notify about other workers' entries) before taking the journal
+            # lock; under it only what was appended in between is left to replay
+            self._fresh()
+            with self.log.lock:
+                df = self._fresh()
+                order_ids = list(dict.fromkeys(order_ids))
+                positions = self._index().get_indexer(order_ids) if not df.empty else np.full(len(order_ids), -1)
+                current = df['Order Status'].to_numpy() if not df.empty else np.array([])
+
+                updated, previous, not_found, skipped, unchanged = [], [], [], [], []
+                for order_id, pos in zip(order_ids, positions):
+                    if pos < 0:
+                        not_found.append(order_id)
+                    elif current[pos] == status:
+                        # Already there: nothing to journal or broadcast. A repeated
+                        # cancellation keeps the original reason.
+                        unchanged.append(order_id)
+                    elif current[pos] in skip_statuses:
+                        skipped.append(order_id)
+                    else:
+                        updated.append(order_id)
+                        previous.append(current[pos])
+
+                if updated:
+                    entry = {
+                        "seq": self.seq + 1,
+                        "ts": datetime.now().isoformat(timespec='seconds'),
+                        "op": "set_status",
+                        "order_ids": updated,
+                        "status": status,
+                        "previous_status": previous,
+                        "reason": reason
+                    }
+                    if source:
+                        # Lets listeners tell apart updates they caused themselves
+                        entry["source"] = source
+                    # Durable first, then visible
+                    self._log_offset = self.log.append([entry])
+                    self._log_inode = self.log.stamp()[0]
+                    self.seq = entry["seq"]
+                    self._apply(entry)
+                    self._pending += 1
+                    self._schedule_compaction()
+
+            if updated:
+                self._notify(entry)
+            return {"updated": updated, "not_found": not_found, "skipped": skipped, "unchanged": unchanged}
+
+    def _schedule_compaction(self):
+        if self._pending >= self.compact_batch:
+            threading.Thread(target=self.compact, daemon=True).start()
+        elif self._compact_timer is None:
+            self._compact_timer = threading.Timer(self.compact_interval, self.compact)
+            self._compact_timer.daemon = True
+            self._compact_timer.start()
+
+    def compact(self):
+        # Fold journaled mutations into the table file, then trim the journal up to that point.
+        # The (slow) table write happens outside the store lock so reads and writes keep flowing.
+        if not self._compact_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._compact_file_lock:
+                return self._compact()
+        finally:
+            self._compact_lock.release()
+
+    def _compact(self):
+        with self._lock:
+            # Another worker may have compacted while we waited for the file lock
+            self._fresh()
+            if self._compact_timer is not None:
+                self._compact_timer.cancel()
+                self._compact_timer = None
+            if not self._pending or self._df is None or self._df.empty:
+                return False
+            orders, parties, seq = self._df.copy(), dict(self.parties), self.seq
+
+        # Written aside and swapped in, so other workers never read a half-written table.
+        # The snapshot is keyed by the temp file's mtime, which the rename preserves, so it
+        # is in place before any worker notices the new table.
+        tmp_path = temp_table_path(self.path)
+        write_order_tables(orders, parties, tmp_path)
+        mtime = os.stat(tmp_path).st_mtime_ns
+        if self.snapshots:
+            write_snapshot(orders, parties, self.path, mtime)
+
+        with self._lock, self.log.lock:
+            os.replace(tmp_path, self.path)
+            self._mtime = mtime
+            self._follow_log()
+            remaining = [e for e in self.log.read() if e.get('op') != 'checkpoint' and e.get('seq', 0) > seq]
+            checkpoint = {"seq": seq, "ts": datetime.now().isoformat(timespec='seconds'), "op": "checkpoint"}
+            self.log.rewrite([checkpoint] + remaining)
+            self._log_inode, self._log_offset = self.log.stamp()
+            self._pending = len(remaining)
+            if self._pending:
+                self._schedule_compaction()
+        return True
+
+    def memory_usage(self):
+        with self._lock:
+            self._fresh()
+            total = self._df.memory_usage(deep=True).sum()
+            total += sum(dim.memory_usage(deep=True).sum() for dim in self.parties.values())
+            return int(total)
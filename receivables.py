@@ -0,0 +1,216 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from order_store import orders_to_records
+
+DAY_NS = 86400 * 10**9
+# (label, first day overdue, last day overdue); None means open-ended
+AGING_BUCKETS = [('0-30', 0, 30), ('31-60', 31, 60), ('60+', 61, None)]
+# The scheduler re-checks at least this often, so config edits and reloads are picked up
+MAX_SLEEP = 60.0
+
+
+def now_ns():
+    # Due dates are naive local dates, like the rest of the order data
+    return pd.Timestamp.now().value
+
+
+class ReceivablesIndex:
+    # Orders with a balance outstanding, sorted by payment due date. An order is overdue
+    # once it has been delivered and its due date has passed, so "overdue as of now" is a
+    # binary search over the sorted dates, and each aging bucket is a slice between two
+    # more searches. Balances and due dates don't change after load; delivery (status)
+    # does, and is patched in place from the store's mutation events.
+
+    def __init__(self, get_store, get_config):
+        self.get_store = get_store
+        self.get_config = get_config
+        self._lock = threading.Lock()
+        self._key = None
+        self.due = np.empty(0, dtype='int64')
+
+    def _current_key(self, store):
+        config = self.get_config()
+        return id(store), store.generation, config.get('payment_due_days')
+
+    def _build(self, store, key):
+        df = store.frame
+        n = len(df)
+        if df.empty:
+            amount = advance = np.zeros(0)
+            due = np.empty(0, dtype='datetime64[ns]')
+            delivered = np.zeros(0, dtype=bool)
+        else:
+            amount = df['Total Amount'].fillna(0).to_numpy(dtype='float64')
+            advance = df['Advance Amount'].fillna(0).to_numpy(dtype='float64')
+            due = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+            if 'Payment Due Date' in df.columns:
+                due = df['Payment Due Date'].astype('datetime64[ns]')
+            if 'Delivered Date' in df.columns:
+                # No explicit due date: payment_due_days after delivery
+                terms = pd.Timedelta(days=key[2] or 0)
+                due = due.fillna(df['Delivered Date'].astype('datetime64[ns]') + terms)
+            due = due.to_numpy()
+            delivered = (df['Order Status'] == 'Delivered').to_numpy()
+
+        balance = amount - advance
+        owing = np.flatnonzero((balance > 0) & ~np.isnat(due))
+        order = owing[np.argsort(due[owing], kind='stable')]
+        self.rows = order
+        self.due = due[order].astype('int64')
+        self.balance = balance[order]
+        self.delivered = delivered[order]
+        # Row position -> slot in the sorted arrays, for patching status changes
+        self.slot = np.full(n, -1, dtype='int64')
+        self.slot[order] = np.arange(len(order))
+        self._key = key
+
+    def _current(self, store):
+        key = self._current_key(store)
+        if self._key != key:
+            self._build(store, key)
+
+    def on_mutation(self, entry):
+        # Store listener: runs under the store lock, right after the mutation is applied
+        if entry.get('op') != 'set_status':
+            return
+        store = self.get_store()
+        with self._lock:
+            if self._key is None or self._key[:2] != (id(store), store.generation):
+                return
+            positions = store.positions(entry['order_ids'])
+            slots = self.slot[positions[positions >= 0]]
+            self.delivered[slots[slots >= 0]] = entry['status'] == 'Delivered'
+
+    def _bounds(self, now):
+        # Slot where overdue ends, and where each aging bucket begins (oldest due first)
+        end = np.searchsorted(self.due, now, side='left')
+        bounds = []
+        for label, first, last in AGING_BUCKETS:
+            # days overdue = whole days since the due date; <= last means due > now - (last + 1) days
+            start = 0 if last is None else np.searchsorted(self.due, now - (last + 1) * DAY_NS, side='right')
+            stop = min(end, np.searchsorted(self.due, now - first * DAY_NS, side='right'))
+            bounds.append((label, min(start, stop), stop))
+        return end, bounds
+
+    def summary(self, now=None):
+        now = now_ns() if now is None else now
+        store = self.get_store()
+        with store.lock, self._lock:
+            self._current(store)
+            end, bounds = self._bounds(now)
+            buckets = []
+            for label, start, stop in bounds:
+                delivered = self.delivered[start:stop]
+                buckets.append({
+                    "bucket": label,
+                    "count": int(np.count_nonzero(delivered)),
+                    "amount": float(self.balance[start:stop][delivered].sum())
+                })
+        return {
+            "as_of": pd.Timestamp(now).strftime('%Y-%m-%d %H:%M:%S'),
+            "overdue_count": sum(b["count"] for b in buckets),
+            "overdue_amount": sum(b["amount"] for b in buckets),
+            "buckets": buckets
+        }
+
+    def overdue_orders(self, bucket=None, limit=100, offset=0, now=None):
+        # Most overdue first
+        now = now_ns() if now is None else now
+        store = self.get_store()
+        with store.lock, self._lock:
+            self._current(store)
+            end, bounds = self._bounds(now)
+            start, stop = 0, end
+            if bucket is not None:
+                start, stop = next((b[1], b[2]) for b in bounds if b[0] == bucket)
+            slots = start + np.flatnonzero(self.delivered[start:stop])
+            total = len(slots)
+            slots = slots[offset:offset + limit]
+            records = orders_to_records(store.joined(store.frame.iloc[self.rows[slots]]))
+            days = (now - self.due[slots]) // DAY_NS
+        for record, d, s in zip(records, days, slots):
+            record["Balance"] = float(self.balance[s])
+            record["Days Overdue"] = int(d)
+        return {"total": total, "orders": records}
+
+    def overdue_mask(self, now=None):
+        # Per row of the store's frame: (overdue, days overdue or -1)
+        now = now_ns() if now is None else now
+        store = self.get_store()
+        with store.lock, self._lock:
+            self._current(store)
+            end = np.searchsorted(self.due, now, side='left')
+            overdue = np.zeros(len(self.slot), dtype=bool)
+            days = np.full(len(self.slot), -1, dtype='int64')
+            hit = np.flatnonzero(self.delivered[:end])
+            overdue[self.rows[hit]] = True
+            days[self.rows[hit]] = (now - self.due[hit]) // DAY_NS
+        return overdue, days
+
+    def crossed(self, since, now):
+        # Delivered orders whose due date passed in [since, now)
+        store = self.get_store()
+        with store.lock, self._lock:
+            self._current(store)
+            start = np.searchsorted(self.due, since, side='left')
+            stop = np.searchsorted(self.due, now, side='left')
+            slots = start + np.flatnonzero(self.delivered[start:stop])
+            return store.frame['Order No'].to_numpy()[self.rows[slots]].astype(str).tolist()
+
+    def next_due(self, now):
+        # Earliest due date at or after now among delivered orders still owing, or None
+        store = self.get_store()
+        with store.lock, self._lock:
+            self._current(store)
+            start = np.searchsorted(self.due, now, side='left')
+            ahead = np.flatnonzero(self.delivered[start:])
+            return int(self.due[start + ahead[0]]) if len(ahead) else None
+
+
+class OverdueScheduler:
+    # Sleeps until the next due date among delivered, unpaid orders and reports the orders
+    # that just went overdue at that moment, instead of everyone re-deriving overdue state
+    # on every poll. Mutations wake it early, since a delivery can bring the next due date closer.
+
+    def __init__(self, index, on_overdue, max_sleep=MAX_SLEEP):
+        self.index = index
+        self.on_overdue = on_overdue
+        self.max_sleep = max_sleep
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def on_mutation(self, entry):
+        self._wake.set()
+
+    def _run(self):
+        since = now_ns()
+        while not self._stop.is_set():
+            now = now_ns()
+            try:
+                crossed = self.index.crossed(since, now)
+                if crossed:
+                    self.on_overdue(crossed)
+                upcoming = self.index.next_due(now)
+            except Exception as e:
+                print(f"Overdue scheduler error: {e}")
+                upcoming = None
+            since = now
+            timeout = self.max_sleep
+            if upcoming is not None:
+                # Overdue starts strictly after the due instant
+                timeout = min(timeout, (upcoming - now) / 1e9 + 0.001)
+            self._wake.wait(timeout)
+            self._wake.clear()
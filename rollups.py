@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# group= values accepted by the rollup API and the order column each one buckets by
+ROLLUP_GROUPS = {
+    'order_type': 'Order Type',
+    'item': 'Item',
+    'buyer': 'Buyer ID',
+    'status': 'Order Status'
+}
+GRANULARITIES = {'month': 'M', 'week': 'W-SUN', 'day': 'D'}
+CUBE_KEYS = ['Day', 'Order Type', 'Item', 'Buyer ID', 'Order Status']
+
+
+class OrderRollups:
+    # Chart aggregates served from a pre-bucketed cube: orders and revenue per
+    # (order day, type, item, buyer, status). The cube has at most a few hundred thousand
+    # cells regardless of order count, and status changes are folded in as +/- deltas
+    # instead of recomputing from the raw orders.
+
+    def __init__(self, get_store):
+        self.get_store = get_store
+        self._lock = threading.Lock()
+        self._cube = None
+        self._deltas = []
+        self._generation = None
+        self._store_id = None
+
+    def _build(self, store):
+        df = store.frame
+        if df.empty:
+            cube = pd.DataFrame(columns=CUBE_KEYS + ['orders', 'revenue'])
+        else:
+            cube = self._cells(df, np.ones(len(df), dtype='int64'))
+        self._cube = cube
+        self._deltas = []
+        self._generation = store.generation
+        self._store_id = id(store)
+
+    def _cells(self, df, sign, status=None):
+        cells = pd.DataFrame({
+            'Day': df['Order Date'].dt.normalize().to_numpy(),
+            'Order Type': df['Order Type'].astype(object).to_numpy(),
+            'Item': df['Item'].astype(object).to_numpy(),
+            'Buyer ID': df['Buyer ID'].to_numpy(),
+            'Order Status': df['Order Status'].astype(object).to_numpy() if status is None else status,
+            'orders': sign,
+            'revenue': sign * df['Total Amount'].to_numpy(dtype='int64')
+        })
+        return cells.groupby(CUBE_KEYS, dropna=False, as_index=False).sum()
+
+    def _stale(self, store):
+        return self._cube is None or self._store_id != id(store) or self._generation != store.generation
+
+    def on_mutation(self, entry):
+        # Store listener: runs under the store lock, right after the mutation is applied
+        if entry.get('op') != 'set_status':
+            return
+        store = self.get_store()
+        with self._lock:
+            if self._stale(store):
+                return
+            rows = store.select(entry['order_ids'])
+            if rows.empty:
+                return
+            previous = np.array(entry.get('previous_status', []), dtype=object)
+            if len(previous) == len(rows):
+                self._deltas.append(self._cells(rows, -np.ones(len(rows), dtype='int64'), status=previous))
+            self._deltas.append(self._cells(rows, np.ones(len(rows), dtype='int64')))
+
+    def _current_cube(self):
+        store = self.get_store()
+        # Same lock order as on_mutation (which runs under the store lock)
+        with store.lock, self._lock:
+            if self._stale(store):
+                self._build(store)
+            elif self._deltas:
+                merged = pd.concat([self._cube] + self._deltas, ignore_index=True)
+                merged = merged.groupby(CUBE_KEYS, dropna=False, as_index=False).sum()
+                self._cube = merged[merged['orders'] != 0].reset_index(drop=True)
+                self._deltas = []
+            return self._cube, store
+
+    def query(self, granularity='month', group=None, start=None, end=None, order_type=None, status=None, top=None):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {list(GRANULARITIES)}")
+        if group is not None and group not in ROLLUP_GROUPS:
+            raise ValueError(f"group must be one of {list(ROLLUP_GROUPS)}")
+        if top is not None and top < 1:
+            raise ValueError("top must be positive")
+
+        cube, store = self._current_cube()
+        mask = np.ones(len(cube), dtype=bool)
+        if start is not None:
+            mask &= (cube['Day'] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (cube['Day'] <= pd.Timestamp(end)).to_numpy()
+        if order_type:
+            mask &= (cube['Order Type'] == order_type).to_numpy()
+        if status:
+            mask &= (cube['Order Status'] == status).to_numpy()
+        cube = cube[mask]
+
+        period = pd.to_datetime(cube['Day']).dt.to_period(GRANULARITIES[granularity]).dt.start_time
+        keys = [period.rename('period')]
+        group_col = ROLLUP_GROUPS.get(group)
+        if group_col:
+            keys.append(cube[group_col].rename('key'))
+        buckets = cube[['orders', 'revenue']].groupby(keys, dropna=False).sum().reset_index()
+
+        result = {"granularity": granularity, "group": group, "buckets": [], "totals": []}
+        if group_col:
+            totals = buckets.groupby('key', as_index=False)[['orders', 'revenue']].sum()
+            totals = totals.sort_values('revenue', ascending=False)
+            if top:
+                totals = totals.head(top)
+                buckets = buckets[buckets['key'].isin(totals['key'])]
+            if group == 'buyer':
+                names = store.party_table('Buyer ID').set_index('Buyer ID')['Buyer Name']
+                totals['key'] = totals['key'].map(names)
+                buckets['key'] = buckets['key'].map(names)
+            result["totals"] = [
+                {"key": key, "orders": int(orders), "revenue": int(revenue)}
+                for key, orders, revenue in zip(totals['key'], totals['orders'], totals['revenue'])
+            ]
+
+        result["buckets"] = [
+            {
+                "period": p.strftime('%Y-%m-%d'),
+                **({"key": k} if group_col else {}),
+                "orders": int(o),
+                "revenue": int(r)
+            }
+            for p, k, o, r in zip(
+                buckets['period'],
+                buckets['key'] if group_col else [None] * len(buckets),
+                buckets['orders'],
+                buckets['revenue']
+            )
+        ]
+        return result
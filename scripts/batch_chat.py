@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+# Data paths in utils are relative to the project root
+os.chdir(ROOT_DIR)
+
+import utils
+from ai_agent_multi import MultiAgentOrchestrator
+from chat_batch import run_batch, DEFAULT_WORKERS, DEFAULT_LLM_CONCURRENCY
+
+
+def read_queries(path):
+    # A JSON list of strings, or one query per line (blank lines and # comments skipped)
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith('#')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a batch of chat queries, e.g. the morning reports, and write one JSON report")
+    parser.add_argument("queries", help="File with one query per line, or a JSON list")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report (default: stdout)")
+    parser.add_argument("--data", default=None, help="Order table to query (default: the portal's)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Queries in flight at once")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY, help="LLM calls in flight at once")
+    args = parser.parse_args()
+
+    if args.data:
+        utils.ORDER_DB_PATH = args.data
+    queries = read_queries(args.queries)
+    report = run_batch(MultiAgentOrchestrator(utils.ORDER_DB_PATH), queries, workers=args.workers, llm_concurrency=args.llm_concurrency)
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Wrote {args.output}: {report['queries']} queries in {report['total_ms']} ms, "
+              f"{report['steps_deduplicated']} steps deduplicated", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
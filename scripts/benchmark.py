@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+# app.py mounts static/ and templates/ relative to the working directory
+os.chdir(ROOT_DIR)
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import generate_data
+import utils
+from order_store import compact_orders, normalize_parties
+import app as app_module
+from ai_agent_multi import MultiAgentOrchestrator
+from llm_backends import StubBackend
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def time_call(fn, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "max_ms": round(max(timings), 3)
+    }
+
+
+def run_size(size, seed, repeat, file_format, work_dir):
+    data_path = os.path.join(work_dir, f'orders_{size}.{file_format}')
+    df = generate_data.build_orders_df(size, seed=seed)
+    generate_data.write_orders(df, data_path)
+    order_ids = df['Order No'].sample(n=max(repeat, 1), random_state=seed, replace=size < repeat).tolist()
+
+    utils.ORDER_DB_PATH = data_path
+    utils.DATA_DIR = work_dir
+    # The deterministic offline backend, so the chat pipeline runs without network access
+    app_module.ai_agent = MultiAgentOrchestrator(data_path, model=StubBackend())
+    client = TestClient(app_module.app)
+
+    def check(response):
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.request.url} returned {response.status_code}")
+        return response
+
+    benches = {
+        "get_orders_df": lambda i: utils.get_orders_df(),
+        "get_order_by_id": lambda i: utils.get_order_by_id(order_ids[i]),
+        "api_orders": lambda i: check(client.get('/api/orders')).content,
+        "api_dashboard_stats": lambda i: check(client.get('/api/dashboard-stats')).content,
+        "invoice_pdf": lambda i: utils.generate_invoice_pdf(order_ids[i]),
+        "chat_fake_llm": lambda i: check(client.post('/api/chat', json={"query": "How many orders were delivered?"})).content,
+        # Mutates the dataset, so it runs last
+        "cancel_order": lambda i: utils.cancel_order(order_ids[i], "benchmark")
+    }
+
+    results = {}
+    for name, fn in benches.items():
+        results[name] = time_call(fn, repeat)
+        print(f"  {size:>9} {name:<22} median {results[name]['median_ms']:>11.2f} ms")
+    return results
+
+
+def legacy_orders_df(df):
+    # What get_orders_df() held before the typed store: object strings + datetime64 columns
+    df = df.astype({c: object for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])})
+    for col in ['Order Date', 'Expected Delivery', 'Shipped Date', 'Delivered Date', 'Payment Due Date']:
+        df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def legacy_records(df):
+    # What get_all_orders() materialized on every call before the typed store
+    df = df.copy()
+    for col in df.select_dtypes(include=['datetime64']).columns:
+        df[col] = df[col].astype(str).replace('NaT', None)
+    return df.fillna('').to_dict('records')
+
+
+def measure_memory(size, seed, per=100000):
+    df = generate_data.build_orders_df(size, seed=seed)
+    legacy = legacy_orders_df(df)
+    compact, parties = normalize_parties(compact_orders(df))
+
+    tracemalloc.start()
+    records = legacy_records(legacy)
+    records_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+
+    scale = per / size
+    mb = lambda n: round(n * scale / 2**20, 2)
+    result = {
+        "orders": size,
+        "per_orders": per,
+        "legacy_frame_mb": mb(legacy.memory_usage(deep=True).sum()),
+        "legacy_records_mb": mb(records_bytes),
+        "compact_frame_mb": mb(compact.memory_usage(deep=True).sum() + sum(d.memory_usage(deep=True).sum() for d in parties.values()))
+    }
+    print(f"\nMemory per {per} orders: legacy frame {result['legacy_frame_mb']} MB, "
+          f"legacy records {result['legacy_records_mb']} MB, compact frame {result['compact_frame_mb']} MB")
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(current, baseline, threshold):
+    # Compare medians per (size, benchmark); returns rows that got slower than the threshold
+    regressions = []
+    print(f"\n{'size':>9} {'benchmark':<22} {'baseline':>12} {'current':>12} {'change':>8}")
+    for size, benches in current["results"].items():
+        for name, stats in benches.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if not old or not old["median_ms"]:
+                continue
+            change = stats["median_ms"] / old["median_ms"] - 1
+            flag = " REGRESSION" if change > threshold else ""
+            print(f"{size:>9} {name:<22} {old['median_ms']:>10.2f}ms {stats['median_ms']:>10.2f}ms {change:>+7.0%}{flag}")
+            if flag:
+                regressions.append((size, name, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the order data layer and API on synthetic datasets")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Comma separated dataset sizes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--format", choices=["csv", "parquet", "xlsx"], default="csv", help="Dataset file format (xlsx is limited to ~1M rows)")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report")
+    parser.add_argument("--compare", default=None, help="Baseline report to diff against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown flagged as a regression")
+    parser.add_argument("--memory-size", type=int, default=100000, help="Dataset size for the memory footprint report (0 to skip)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec='seconds'),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "format": args.format
+        },
+        "results": {},
+        "memory": None
+    }
+
+    original_db_path, original_data_dir = utils.ORDER_DB_PATH, utils.DATA_DIR
+    work_dir = tempfile.mkdtemp(prefix='order_bench_')
+    try:
+        for size in sizes:
+            report["results"][str(size)] = run_size(size, args.seed, args.repeat, args.format, work_dir)
+    finally:
+        utils.ORDER_DB_PATH, utils.DATA_DIR = original_db_path, original_data_dir
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.memory_size:
+        report["memory"] = measure_memory(args.memory_size, args.seed)
+
+    output = args.output or os.path.join('bench', f"report_{report['meta']['git_revision'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
+import argparse
+import numpy as np
 import pandas as pd
-import random
-from datetime import datetime, timedelta
+from datetime import datetime
 from docx import Document
 import os
 
 # Constants
-ORDER_STATUSES = ['Ordered', 'Packaging', 'Shipped', 'Delivered']
 ORDER_TYPES = ['Packaging Films', 'Aseptic Liquid Packaging', 'Chemicals', 'Holography', 'Engineering Machinery']
 BUYERS = [
     {
@@ -38,79 +38,123 @@ ITEMS = {
     'Engineering Machinery': ['Slitting Machine', 'Pouch Making Machine', 'Printing Machine']
 }
 
-def generate_orders(num_orders=50):
-    orders = []
-    for i in range(num_orders):
-        order_type = random.choice(ORDER_TYPES)
-        item = random.choice(ITEMS[order_type])
-        buyer = random.choice(BUYERS)
-        
-        order_date = datetime.now() - timedelta(days=random.randint(1, 180))
-        status = random.choice(ORDER_STATUSES)
-        
-        # Logic for status and dates
-        shipped_date = None
-        delivered_date = None
-        
-        if status == 'Ordered':
-            delivery_days = random.randint(5, 15)
-            expected_delivery = order_date + timedelta(days=delivery_days)
-        elif status == 'Packaging':
-            delivery_days = random.randint(4, 12)
-            expected_delivery = order_date + timedelta(days=delivery_days)
-        elif status == 'Shipped':
-            delivery_days = random.randint(2, 8)
-            expected_delivery = order_date + timedelta(days=delivery_days)
-            shipped_date = order_date + timedelta(days=random.randint(1, 3))
-        else: # Delivered
-            delivery_days = random.randint(2, 10)
-            expected_delivery = order_date + timedelta(days=delivery_days)
-            shipped_date = order_date + timedelta(days=random.randint(1, 3))
-            delivered_date = shipped_date + timedelta(days=random.randint(2, 5))
-            # Ensure delivered date is not in future
-            if delivered_date > datetime.now():
-                delivered_date = datetime.now() - timedelta(days=random.randint(0, 2))
-            if shipped_date > delivered_date:
-                shipped_date = delivered_date - timedelta(days=random.randint(1, 3))
-
-        quantity = random.randint(10, 500) * 10
-        unit_cost = random.randint(100, 5000)
-        total_cost = quantity * unit_cost
-        
-        # Advance Payment (10-30%)
-        advance_percentage = random.randint(10, 30) / 100
-        advance_amount = round(total_cost * advance_percentage, 2)
-        
-        # Payment Due Date (60 days from Order Date)
-        payment_due_date = order_date + timedelta(days=60)
-        
-        order = {
-            "Order No": f"ORD-{10000+i}",
-            "Order Date": order_date.strftime("%Y-%m-%d"),
-            "Order Status": status,
-            "Order Type": order_type,
-            "Item": item,
-            "Quantity": quantity,
-            "Unit Cost": unit_cost,
-            "Total Amount": total_cost,
-            "Advance Amount": advance_amount,
-            "Expected Delivery": expected_delivery.strftime("%Y-%m-%d %H:%M"),
-            "Shipped Date": shipped_date.strftime("%Y-%m-%d %H:%M") if shipped_date else None,
-            "Delivered Date": delivered_date.strftime("%Y-%m-%d %H:%M") if delivered_date else None,
-            "Payment Due Date": payment_due_date.strftime("%Y-%m-%d"),
-            "Buyer Name": buyer["name"],
-            "Buyer Address": buyer["address"],
-            "Buyer GST": buyer["gst"],
-            "Seller Name": SELLER["name"],
-            "Seller Address": SELLER["address"],
-            "Seller TIN": SELLER["tin"]
-        }
-        orders.append(order)
-    
-    df = pd.DataFrame(orders)
-    os.makedirs('data', exist_ok=True)
-    df.to_excel('data/order_db_v2.xlsx', index=False)
-    print("Generated data/order_db_v2.xlsx")
+# Production flow the generated statuses follow; older orders are further along
+ORDER_STAGES = ['PO Received', 'Film Extrusion', 'Printing', 'Lamination', 'Slitting', 'QC', 'Dispatch', 'Delivered']
+STRUCTURES = ['BOPP 20µ / PE 40µ', 'PET 12µ / PE 50µ', 'PET / PE / EVOH / PE', 'PET / ALU / PE', 'BOPP / MET PET / PE']
+CARRIERS = ['DHL', 'FedEx', 'Delhivery', 'DTDC', 'Blue Dart']
+CREDIT_DAYS = [45, 60, 90]
+ORDER_HORIZON_DAYS = 180
+
+
+def build_orders_df(num_orders=50, seed=None, now=None):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now or datetime.now()).normalize()
+    n = num_orders
+
+    type_idx = rng.integers(0, len(ORDER_TYPES), n)
+    # Items are drawn per order type: pick a random slot and wrap it into that type's item list
+    item_lists = [ITEMS[t] for t in ORDER_TYPES]
+    item_counts = np.array([len(items) for items in item_lists])
+    item_offsets = np.concatenate([[0], np.cumsum(item_counts)[:-1]])
+    flat_items = np.array([item for items in item_lists for item in items], dtype=object)
+    item_idx = item_offsets[type_idx] + rng.integers(0, 1 << 30, n) % item_counts[type_idx]
+    buyer_idx = rng.integers(0, len(BUYERS), n)
+
+    age_days = rng.integers(1, ORDER_HORIZON_DAYS + 1, n)
+    order_date = now - pd.to_timedelta(age_days, unit='D')
+
+    # Status correlates with order age, with noise so every stage is populated
+    progress = age_days / ORDER_HORIZON_DAYS + rng.normal(0, 0.25, n)
+    stage_idx = np.clip((progress * len(ORDER_STAGES)).astype(int), 0, len(ORDER_STAGES) - 1)
+    dispatched = stage_idx >= ORDER_STAGES.index('Dispatch')
+    delivered = stage_idx == ORDER_STAGES.index('Delivered')
+
+    ship_time = pd.Timedelta(hours=16, minutes=15)
+    shipped_date = order_date + pd.to_timedelta(rng.integers(1, 4, n), unit='D') + ship_time
+    delivered_date = shipped_date + pd.to_timedelta(rng.integers(2, 6, n), unit='D')
+    # Delivered orders can't be delivered in the future
+    delivered_date = delivered_date.where(delivered_date <= now, now - pd.Timedelta(days=1) + ship_time)
+    shipped_date = shipped_date.where(shipped_date < delivered_date, delivered_date - pd.Timedelta(days=1))
+
+    expected_delivery = np.where(
+        delivered,
+        order_date + pd.to_timedelta(rng.integers(2, 11, n), unit='D') + ship_time,
+        order_date + pd.Timedelta(days=61)
+    )
+    expected_delivery = pd.DatetimeIndex(expected_delivery)
+    shipped_date = shipped_date.where(dispatched)
+    delivered_date = delivered_date.where(delivered)
+
+    credit_days = np.array(CREDIT_DAYS)[rng.integers(0, len(CREDIT_DAYS), n)]
+    due_base = delivered_date.where(delivered, expected_delivery).normalize()
+    payment_due_date = due_base + pd.to_timedelta(credit_days, unit='D')
+
+    quantity = rng.integers(10, 501, n) * 10
+    unit_cost = rng.integers(100, 5001, n)
+    total_cost = quantity * unit_cost
+    # Advance Payment (10-30%)
+    advance_amount = np.round(total_cost * rng.integers(10, 31, n) / 100, 2)
+
+    awb = pd.Series(rng.integers(10**11, 10**12, n)).astype(str)
+    carrier = pd.Series(np.array(CARRIERS, dtype=object)[rng.integers(0, len(CARRIERS), n)])
+    shipment_status = np.select(
+        [delivered, dispatched & (rng.random(n) < 0.6)],
+        ['Delivered', 'Out for Delivery'],
+        'Pending Dispatch'
+    )
+    shipment_status = np.where(dispatched & (shipment_status == 'Pending Dispatch'), 'In Transit', shipment_status)
+    ref_chars = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'))
+    customer_ref = 'CUST-' + pd.Series(ref_chars[rng.integers(0, len(ref_chars), (n, 6))].view(f'<U6').ravel())
+
+    buyers = pd.DataFrame(BUYERS)
+    df = pd.DataFrame({
+        "Order No": 'ORD-' + pd.Series(np.arange(10000, 10000 + n)).astype(str),
+        "Order Date": order_date,
+        "Order Status": np.array(ORDER_STAGES, dtype=object)[stage_idx],
+        "Order Type": np.array(ORDER_TYPES, dtype=object)[type_idx],
+        "Item": flat_items[item_idx],
+        "Quantity": quantity,
+        "Unit Cost": unit_cost,
+        "Total Amount": total_cost,
+        "Advance Amount": advance_amount,
+        "Expected Delivery": expected_delivery,
+        "Shipped Date": shipped_date.strftime("%Y-%m-%d %H:%M"),
+        "Delivered Date": delivered_date,
+        "Payment Due Date": payment_due_date.strftime("%Y-%m-%d"),
+        "Buyer Name": buyers['name'].to_numpy()[buyer_idx],
+        "Buyer Address": buyers['address'].to_numpy()[buyer_idx],
+        "Buyer GST": buyers['gst'].to_numpy()[buyer_idx],
+        "Seller Name": SELLER["name"],
+        "Seller Address": SELLER["address"],
+        "Seller TIN": SELLER["tin"],
+        "Structure": np.array(STRUCTURES, dtype=object)[rng.integers(0, len(STRUCTURES), n)],
+        "Thickness": pd.Series(rng.integers(40, 120, n)).astype(str) + 'µ',
+        "Width": pd.Series(rng.integers(300, 1200, n)).astype(str) + 'mm',
+        "Customer Ref": customer_ref,
+        "Carrier": carrier.where(dispatched, 'Pending'),
+        "AWB": awb.where(dispatched, 'Pending'),
+        "Tracking Link": ('https://example.com/track/' + awb).where(dispatched),
+        "Shipment Status": shipment_status,
+        "Credit Days": credit_days
+    })
+    return df
+
+
+def write_orders(df, output_path=os.path.join('data', 'order_db_v2.xlsx')):
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    if output_path.endswith('.csv'):
+        df.to_csv(output_path, index=False)
+    elif output_path.endswith('.parquet'):
+        df.to_parquet(output_path, index=False)
+    else:
+        # Excel caps out at 1,048,576 rows; use .csv or .parquet beyond that
+        df.to_excel(output_path, index=False)
+    print(f"Generated {output_path} ({len(df)} orders)")
+    return output_path
+
+
+def generate_orders(num_orders=50, seed=None, output_path=os.path.join('data', 'order_db_v2.xlsx')):
+    return write_orders(build_orders_df(num_orders, seed=seed), output_path)
 
 def create_invoice_template():
     doc = Document()
@@ -160,5 +204,13 @@ def create_invoice_template():
     print("Generated data/invoice_template.docx")
 
 if __name__ == "__main__":
-    generate_orders()
-    create_invoice_template()
+    parser = argparse.ArgumentParser(description="Generate synthetic order data")
+    parser.add_argument("--orders", type=int, default=50, help="Number of orders to generate")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible datasets")
+    parser.add_argument("--output", default=os.path.join('data', 'order_db_v2.xlsx'), help="Output path (.xlsx, .csv or .parquet)")
+    parser.add_argument("--skip-template", action="store_true", help="Don't regenerate the invoice template")
+    args = parser.parse_args()
+
+    generate_orders(args.orders, seed=args.seed, output_path=args.output)
+    if not args.skip_template:
+        create_invoice_template()
@@ -0,0 +1,156 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Orders whose last event is this stage are finished, so they don't count as work in progress
+FINAL_STAGE = 'Delivered'
+# Statuses that aren't stage names themselves, and the stage an order in them is in
+STATUS_STAGES = {'Ordered': 'PO Received', 'In Production': 'Film Extrusion', 'Ready for Dispatch': 'Dispatch', 'Shipped': 'Dispatch'}
+PERCENTILES = [50, 90, 99]
+HOUR_NS = 3600 * 10**9
+
+
+class StageAnalytics:
+    # Dwell time per production stage, work in progress and the slowest open orders,
+    # computed from the stage-event history. Events arrive ordered by (order, timestamp),
+    # so each stage visit lasts until the order's next event: one vectorized diff over
+    # the whole history. The per-visit arrays are cached until new events arrive; only
+    # the ages of open visits depend on the clock and are recomputed per query.
+
+    def __init__(self, get_events, get_store):
+        self.get_events = get_events
+        self.get_store = get_store
+        self._lock = threading.Lock()
+        self._history_key = None
+        self._history = None
+        self._key = None
+        self._visits = None
+        self._row_key = None
+        self._row_codes = None
+
+    def _current_visits(self):
+        events = self.get_events()
+        store = self.get_store()
+        # Completed visits only change with new events; which visits are open also depends
+        # on order statuses, which change far more often and are cheap to re-apply
+        history_key = (id(events), events.version)
+        key = history_key + (id(store), store.generation, store.sequence())
+        with self._lock:
+            if self._history_key != history_key:
+                self._history = self._build(events)
+                self._history_key = history_key
+            if self._key != key:
+                self._visits = {**self._history, **self._open_visits(store, self._history)}
+                self._key = key
+            return self._visits
+
+    def _build(self, events):
+        data, orders, stages, _ = events.ordered_arrays()
+        order, stage, ts = data['order'], data['stage'], data['ts']
+        # Re-scans in the same stage are one visit, starting at the first scan of the run
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (order[1:] != order[:-1]) | (stage[1:] != stage[:-1])
+        order, stage, ts = order[first], stage[first], ts[first]
+        # A visit is closed by the same order's next visit
+        closed = np.zeros(len(order), dtype=bool)
+        closed[:-1] = order[1:] == order[:-1]
+        end = np.roll(ts, -1)
+        # ...but it only measures dwell in its stage when no stages were skipped on the way.
+        # Orders seeded from the order sheet jump from PO Received straight to Dispatch; that
+        # gap spans every production stage and says nothing about PO Received.
+        dwell = closed & (np.roll(stage, -1) <= stage + 1)
+
+        # Sorting once by (stage, dwell) turns every per-stage percentile into a slice
+        closed_stage = stage[dwell]
+        closed_hours = (end[dwell] - ts[dwell]) / HOUR_NS
+        by_stage = np.lexsort((closed_hours, closed_stage))
+        return {
+            'orders': orders,
+            'stages': stages,
+            'closed_counts': np.bincount(closed_stage, minlength=len(stages)),
+            'closed_hours': closed_hours[by_stage],
+            'last_order': order[~closed],
+            'last_since': ts[~closed]
+        }
+
+    def _open_visits(self, store, history):
+        # The order's current status, not its last event, says which stage it is in now: a
+        # status set by hand moves it without a scan. Then the visit to the current stage is
+        # taken to start at the last event. Delivered and cancelled orders have no open visit.
+        stages = history['stages']
+        current = self._current_stages(store, history['orders'], stages)[history['last_order']]
+        open_ = (current >= 0) & (current != stages.index(FINAL_STAGE))
+        return {
+            'open_order': history['last_order'][open_],
+            'open_stage': current[open_],
+            'open_since': history['last_since'][open_]
+        }
+
+    def _current_stages(self, store, orders, stages):
+        # Stage code of each order's current status, by order code; -1 if cancelled or unknown
+        stage_codes = {stage: i for i, stage in enumerate(stages)}
+        stage_codes.update({status: stage_codes[stage] for status, stage in STATUS_STAGES.items()})
+        current = np.full(len(orders.values), -1, dtype='int64')
+        df = store.frame
+        if df.empty:
+            return current
+        # Order code of each store row; rows only change when the store reloads
+        row_key = (id(store), store.generation, len(orders.values))
+        if self._row_key != row_key:
+            self._row_codes = pd.Index(orders.values).get_indexer(df['Order No'].astype(str))
+            self._row_key = row_key
+        # Looked up per distinct status; the trailing -1 catches missing ones (code -1)
+        status_codes, statuses = pd.factorize(df['Order Status'])
+        lookup = np.array([stage_codes.get(status, -1) for status in statuses] + [-1], dtype='int64')
+        known = self._row_codes >= 0
+        current[self._row_codes[known]] = lookup[status_codes][known]
+        return current
+
+    def stage_stats(self):
+        visits = self._current_visits()
+        # Event timestamps are naive local times, like the rest of the order data
+        now = pd.Timestamp.now().value
+        open_hours = (now - visits['open_since']) / HOUR_NS
+        closed_counts = visits['closed_counts']
+        wip_counts = np.bincount(visits['open_stage'], minlength=len(visits['stages']))
+        wip_hours = np.bincount(visits['open_stage'], weights=open_hours, minlength=len(visits['stages']))
+
+        sorted_hours = visits['closed_hours']
+        offsets = np.concatenate([[0], np.cumsum(closed_counts)])
+
+        result = []
+        for s, stage in enumerate(visits['stages']):
+            dwell = sorted_hours[offsets[s]:offsets[s + 1]]
+            row = {"stage": stage, "completed": int(closed_counts[s]), "wip": int(wip_counts[s])}
+            for p in PERCENTILES:
+                row[f"p{p}_hours"] = round(float(np.percentile(dwell, p)), 2) if len(dwell) else None
+            row["mean_hours"] = round(float(dwell.mean()), 2) if len(dwell) else None
+            row["wip_hours"] = round(float(wip_hours[s]), 2)
+            result.append(row)
+
+        stuck = [row for row in result if row["wip"]]
+        bottleneck = max(stuck, key=lambda row: row["wip_hours"])["stage"] if stuck else None
+        return {"stages": result, "bottleneck": bottleneck, "wip_total": int(wip_counts.sum())}
+
+    def slowest_orders(self, limit=20, stage=None):
+        # Open orders that have sat longest in their current stage
+        visits = self._current_visits()
+        since = visits['open_since']
+        candidates = np.arange(len(since))
+        if stage is not None:
+            candidates = candidates[visits['open_stage'] == visits['stages'].index(stage)]
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(since[candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(since[candidates], kind='stable')]
+
+        now = pd.Timestamp.now().value
+        return [
+            {
+                "order_no": visits['orders'].values[visits['open_order'][i]],
+                "stage": visits['stages'][visits['open_stage'][i]],
+                "since": pd.Timestamp(since[i]).strftime('%Y-%m-%d %H:%M:%S'),
+                "hours_in_stage": round((now - since[i]) / HOUR_NS, 2)
+            }
+            for i in candidates
+        ]
@@ -0,0 +1,293 @@
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from file_lock import FileLock
+
+EVENT_COLUMNS = ['order_no', 'stage', 'timestamp', 'location']
+# Where each production stage happens, used when a feed doesn't report a location
+STAGE_LOCATIONS = {
+    "PO Received": "Sales Office",
+    "Film Extrusion": "Extrusion Line",
+    "Printing": "Print Shop",
+    "Lamination": "Lamination Line",
+    "Slitting": "Slitting Line",
+    "QC": "QC Lab",
+    "Dispatch": "Dispatch Bay",
+    "Delivered": "Customer"
+}
+# Order columns that already carry a real timestamp for a stage
+SEED_COLUMNS = [('Order Date', 'PO Received'), ('Shipped Date', 'Dispatch'), ('Delivered Date', 'Delivered')]
+# Newly ingested events are scanned linearly until there are this many, then folded into the sorted index
+MERGE_THRESHOLD = 50000
+NO_TIMESTAMP = np.iinfo('int64').min
+
+
+def seed_events_from_orders(df):
+    parts = []
+    for col, stage in SEED_COLUMNS:
+        if col not in df.columns:
+            continue
+        has_ts = df[col].notna()
+        parts.append(pd.DataFrame({
+            'order_no': df.loc[has_ts, 'Order No'].astype(str).to_numpy(),
+            'stage': stage,
+            'timestamp': df.loc[has_ts, col].to_numpy(),
+            'location': STAGE_LOCATIONS[stage]
+        }))
+    if not parts:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _timestamp_ns(value, name):
+    if value is None:
+        return None
+    try:
+        ts = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        ts = pd.NaT
+    if pd.isna(ts):
+        raise ValueError(f"{name} is not a valid date: {value!r}")
+    return ts.as_unit('ns').value
+
+
+class _Dictionary:
+    # String <-> int code mapping for order numbers and locations
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, values):
+        inverse, uniques = pd.factorize(np.asarray(values, dtype=object).astype(str))
+        unique_codes = np.empty(len(uniques), dtype='int32')
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = len(self.values)
+                self.codes[value] = code
+                self.values.append(value)
+            unique_codes[i] = code
+        return unique_codes[inverse]
+
+    def decode(self, codes):
+        return np.array([self.values[code] for code in codes], dtype=object)
+
+
+class StageEventStore:
+    # Columnar store of (order, stage, timestamp, location) events.
+    # Events are indexed twice, by order and by stage, as sorted permutations with
+    # CSR-style offsets, so one order's history is a slice lookup even with millions
+    # of events. Fresh events sit in a small unindexed tail until it is merged.
+
+    def __init__(self, path, stages, seed=None):
+        self.path = path
+        self.stages = list(stages)
+        self.stage_codes = {stage: i for i, stage in enumerate(self.stages)}
+        self.seed = seed
+        self.version = 0
+        self._lock = threading.RLock()
+        # Other worker processes append to the same file; we follow it from this byte offset
+        self._file_lock = FileLock(path + '.lock')
+        self._offset = 0
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self.orders = _Dictionary()
+        self.locations = _Dictionary()
+        empty = {'order': np.empty(0, 'int32'), 'stage': np.empty(0, 'int8'), 'ts': np.empty(0, 'int64'), 'loc': np.empty(0, 'int32')}
+        self._base = dict(empty)
+        self._tail = dict(empty)
+        self._by_order = np.empty(0, 'int64')
+        self._order_offsets = np.zeros(1, 'int64')
+        self._by_stage = np.empty(0, 'int64')
+        self._stage_ts = np.empty(0, 'int64')
+        self._stage_offsets = np.zeros(len(self.stages) + 1, 'int64')
+        self._latest_ts = np.empty(0, 'int64')
+        self._latest_stage = np.empty(0, 'int8')
+
+    def _ensure_loaded(self):
+        # Called before taking our lock: the seed reads the order store, which may in turn
+        # be holding its own lock while notifying us
+        if self._loaded:
+            return
+        seed = self.seed() if self.seed is not None else None
+        with self._lock:
+            if self._loaded:
+                return
+            if seed is not None:
+                self._add(self._encode(seed))
+            self._follow()
+            self._merge()
+            self._loaded = True
+
+    def _follow(self):
+        # Pick up rows appended since we last read, by this or another process (complete lines only)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return
+        header = self._offset == 0
+        self._offset += end
+        rows = pd.read_csv(io.BytesIO(data[:end]), header=0 if header else None, names=None if header else EVENT_COLUMNS)
+        if len(rows):
+            self._add(self._encode(rows))
+
+    def _encode(self, events):
+        events = events[events['stage'].isin(self.stage_codes)]
+        ts = pd.to_datetime(events['timestamp'], errors='coerce')
+        events = events[ts.notna()]
+        ts = ts[ts.notna()]
+        locations = events['location'].where(events['location'].notna(), events['stage'].map(STAGE_LOCATIONS))
+        return {
+            'order': self.orders.encode(events['order_no'].to_numpy()),
+            'stage': events['stage'].map(self.stage_codes).to_numpy(dtype='int8'),
+            'ts': pd.DatetimeIndex(ts).as_unit('ns').asi8,
+            'loc': self.locations.encode(locations.to_numpy())
+        }
+
+    def _add(self, batch):
+        # Append to the tail and advance each order's latest stage. Returns (order code, stage code)
+        # for orders whose newest event is now from this batch.
+        for key, values in batch.items():
+            self._tail[key] = np.concatenate([self._tail[key], values])
+
+        n_codes = len(self.orders.values)
+        if len(self._latest_ts) < n_codes:
+            grow = n_codes - len(self._latest_ts)
+            self._latest_ts = np.concatenate([self._latest_ts, np.full(grow, NO_TIMESTAMP, 'int64')])
+            self._latest_stage = np.concatenate([self._latest_stage, np.full(grow, -1, 'int8')])
+
+        codes, ts, stages = batch['order'], batch['ts'], batch['stage']
+        if not len(codes):
+            return np.empty(0, 'int32'), np.empty(0, 'int8')
+        order = np.lexsort((stages, ts, codes))
+        last = order[np.r_[codes[order][1:] != codes[order][:-1], True]]
+        newer = ts[last] >= self._latest_ts[codes[last]]
+        last = last[newer]
+        self._latest_ts[codes[last]] = ts[last]
+        self._latest_stage[codes[last]] = stages[last]
+
+        if len(self._tail['order']) >= MERGE_THRESHOLD:
+            self._merge()
+        self.version += 1
+        return codes[last], stages[last]
+
+    def _merge(self):
+        for key in self._base:
+            self._base[key] = np.concatenate([self._base[key], self._tail[key]])
+            self._tail[key] = self._tail[key][:0]
+        base = self._base
+        self._by_order = np.lexsort((base['ts'], base['order']))
+        self._order_offsets = np.searchsorted(base['order'][self._by_order], np.arange(len(self.orders.values) + 1))
+        self._by_stage = np.lexsort((base['ts'], base['stage']))
+        self._stage_ts = base['ts'][self._by_stage]
+        self._stage_offsets = np.searchsorted(base['stage'][self._by_stage], np.arange(len(self.stages) + 1))
+
+    def _rows(self, base_idx, tail_idx):
+        parts = {key: np.concatenate([self._base[key][base_idx], self._tail[key][tail_idx]]) for key in self._base}
+        order = np.argsort(parts['ts'], kind='stable')
+        return {key: values[order] for key, values in parts.items()}
+
+    def _to_frame(self, rows):
+        return pd.DataFrame({
+            'order_no': self.orders.decode(rows['order']),
+            'stage': np.asarray(self.stages, dtype=object)[rows['stage']],
+            'timestamp': pd.to_datetime(rows['ts'], unit='ns'),
+            'location': self.locations.decode(rows['loc'])
+        })
+
+    def ingest(self, events, persist=True):
+        # Bulk-append events (DataFrame with EVENT_COLUMNS). Returns {order_no: stage} for orders
+        # whose most recent stage changed, so callers can sync the order status.
+        self._ensure_loaded()
+        with self._lock:
+            self._follow()
+            events = events.copy()
+            if 'location' not in events.columns:
+                events['location'] = None
+            batch = self._encode(events)
+            if not len(batch['order']):
+                return {}
+            if persist:
+                self._persist(batch)
+            codes, stages = self._add(batch)
+            return dict(zip(self.orders.decode(codes), (self.stages[s] for s in stages)))
+
+    def _persist(self, batch):
+        frame = self._to_frame(batch)
+        frame['timestamp'] = np.datetime_as_string(batch['ts'].astype('datetime64[ns]'), unit='s')
+        with self._file_lock:
+            self._follow()
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                frame.to_csv(f, header=new_file, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset = f.tell()
+
+    def history(self, order_no):
+        self._ensure_loaded()
+        with self._lock:
+            self._follow()
+            code = self.orders.codes.get(order_no)
+            if code is None:
+                return self._to_frame(self._rows(np.empty(0, 'int64'), np.empty(0, 'int64')))
+            if code + 1 < len(self._order_offsets):
+                base_idx = self._by_order[self._order_offsets[code]:self._order_offsets[code + 1]]
+            else:
+                base_idx = np.empty(0, 'int64')
+            tail_idx = np.flatnonzero(self._tail['order'] == code)
+            return self._to_frame(self._rows(base_idx, tail_idx))
+
+    def by_stage(self, stage, start=None, end=None, limit=None):
+        # Raises ValueError for an unparseable start/end or a limit below 1
+        start = _timestamp_ns(start, 'start')
+        end = _timestamp_ns(end, 'end')
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+        self._ensure_loaded()
+        with self._lock:
+            self._follow()
+            s = self.stage_codes[stage]
+            base_idx = self._by_stage[self._stage_offsets[s]:self._stage_offsets[s + 1]]
+            # Within a stage the index is sorted by timestamp, so the range is a binary search
+            base_ts = self._stage_ts[self._stage_offsets[s]:self._stage_offsets[s + 1]]
+            lo = np.searchsorted(base_ts, start) if start is not None else 0
+            hi = np.searchsorted(base_ts, end, side='right') if end is not None else len(base_idx)
+            base_idx = base_idx[lo:hi]
+
+            tail_mask = self._tail['stage'] == s
+            if start is not None:
+                tail_mask &= self._tail['ts'] >= start
+            if end is not None:
+                tail_mask &= self._tail['ts'] <= end
+            rows = self._rows(base_idx, np.flatnonzero(tail_mask))
+            if limit is not None:
+                rows = {key: values[-limit:] for key, values in rows.items()}
+            return self._to_frame(rows)
+
+    def ordered_arrays(self):
+        # All events as code arrays sorted by (order, timestamp), plus the order and stage names.
+        # Reuses the by-order index, so this is a gather rather than a sort.
+        self._ensure_loaded()
+        with self._lock:
+            self._follow()
+            if len(self._tail['order']):
+                self._merge()
+            data = {key: values[self._by_order] for key, values in self._base.items()}
+            return data, self.orders, list(self.stages), self.version
+
+    def count(self):
+        self._ensure_loaded()
+        with self._lock:
+            self._follow()
+            return len(self._base['order']) + len(self._tail['order'])
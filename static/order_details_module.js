@@ -120,6 +120,9 @@ function renderOrderTimeline(timeline) {
         html += '<div class="step ' + classes.join(' ') + '">';
         html += '<div class="step-circle">' + icon + '</div>';
         html += '<div class="step-label">' + step.stage + '</div>';
+        if (step.timestamp) {
+            html += '<div class="step-date">' + step.timestamp + '</div>';
+        }
         html += '</div>';
     });
 
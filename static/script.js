@@ -57,10 +57,11 @@ document.addEventListener('DOMContentLoaded', () => {
         fetchOrders();
 
         // Filters
-        document.getElementById('dateFilter').addEventListener('change', filterAndRender);
-        document.getElementById('typeFilter').addEventListener('change', filterAndRender);
-        document.getElementById('statusFilter').addEventListener('change', filterAndRender);
-        document.getElementById('sortFilter').addEventListener('change', filterAndRender);
+        // The rollup charts depend on the filters but not on the sort order
+        document.getElementById('dateFilter').addEventListener('change', () => filterAndRender(true));
+        document.getElementById('typeFilter').addEventListener('change', () => filterAndRender(true));
+        document.getElementById('statusFilter').addEventListener('change', () => filterAndRender(true));
+        document.getElementById('sortFilter').addEventListener('change', () => filterAndRender(false));
 
         async function fetchOrders() {
             try {
@@ -68,13 +69,55 @@ document.addEventListener('DOMContentLoaded', () => {
                 const data = await response.json();
                 allOrders = data.orders;
 
-                filterAndRender();
+                filterAndRender(true);
+                subscribeToOrderChanges(response.headers.get('X-Order-Seq'));
             } catch (error) {
                 console.error('Error fetching orders:', error);
             }
         }
 
-        function filterAndRender() {
+        // Live updates: the server pushes only the changed rows; EventSource resumes
+        // from the last event id on reconnect, and 'reset' means we fell too far behind.
+        let orderChanges = null;
+        function subscribeToOrderChanges(seq) {
+            if (orderChanges) orderChanges.close();
+            orderChanges = new EventSource(`/api/orders/stream?since=${seq || 0}`);
+
+            orderChanges.addEventListener('orders', (event) => {
+                const change = JSON.parse(event.data);
+                const indexById = new Map(allOrders.map((o, i) => [o['Order No'], i]));
+                // Rollups count every status unless one is picked, so a status change only
+                // moves them when an order enters or leaves the selected status
+                const statusFilter = document.getElementById('statusFilter').value;
+                let rollupsChanged = false;
+                change.orders.forEach(order => {
+                    const i = indexById.get(order['Order No']);
+                    if (i === undefined) {
+                        allOrders.push(order);
+                        rollupsChanged = true;
+                    } else {
+                        const before = allOrders[i]['Order Status'];
+                        const after = order['Order Status'];
+                        if (statusFilter !== 'all' && before !== after && (before === statusFilter || after === statusFilter)) {
+                            rollupsChanged = true;
+                        }
+                        allOrders[i] = order;
+                    }
+                });
+                filterAndRender(false);
+                if (rollupsChanged) scheduleRollupCharts();
+            });
+
+            // Nothing changed in the rows, but some delivered orders just passed their due date
+            orderChanges.addEventListener('overdue', () => filterAndRender(false));
+
+            orderChanges.addEventListener('reset', () => {
+                orderChanges.close();
+                fetchOrders();
+            });
+        }
+
+        function filterAndRender(refreshRollups) {
             const dateFilter = document.getElementById('dateFilter').value;
             const typeFilter = document.getElementById('typeFilter').value;
             const statusFilter = document.getElementById('statusFilter').value;
@@ -126,6 +169,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             // Render Charts
             renderCharts(filtered);
+            if (refreshRollups) renderRollupCharts();
         }
 
         function updateStats(orders) {
@@ -201,7 +245,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         function renderCharts(orders) {
             // Helper to destroy old charts
-            ['statusChart', 'consumptionChart', 'revenueChart', 'trendChart', 'agingChart', 'topProductsChart'].forEach(id => {
+            ['statusChart', 'revenueChart', 'agingChart'].forEach(id => {
                 if (charts[id]) {
                     charts[id].destroy();
                 }
@@ -240,41 +284,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
             });
 
-            // 2. Consumption by Product Type
-            const typeCounts = {};
-            orders.forEach(o => typeCounts[o['Order Type']] = (typeCounts[o['Order Type']] || 0) + o['Total Amount']);
-
-            const consumptionCtx = document.getElementById('consumptionChart').getContext('2d');
-            charts['consumptionChart'] = new Chart(consumptionCtx, {
-                type: 'bar',
-                data: {
-                    labels: Object.keys(typeCounts),
-                    datasets: [{
-                        label: 'Total Amount',
-                        data: Object.values(typeCounts),
-                        backgroundColor: getGradient(consumptionCtx, '#003073', '#059cf7'),
-                        borderRadius: 5
-                    }]
-                },
-                options: {
-                    plugins: {
-                        legend: { display: false },
-                        tooltip: {
-                            callbacks: {
-                                label: (context) => formatIndianCurrency(context.raw)
-                            }
-                        }
-                    },
-                    scales: {
-                        y: {
-                            beginAtZero: true,
-                            ticks: { callback: (value) => formatCompactNumber(value) }
-                        }
-                    }
-                }
-            });
-
-            // 3. Revenue vs Advance (Buckets by Order Age)
+            // 2. Revenue vs Advance (Buckets by Order Age)
             const now = new Date();
             const revBuckets = { '0-30 Days': { balance: 0, advance: 0 }, '31-60 Days': { balance: 0, advance: 0 }, '61-90 Days': { balance: 0, advance: 0 }, '90+ Days': { balance: 0, advance: 0 } };
 
@@ -345,44 +355,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
             });
 
-            // 4. Order Volume Trend (Monthly)
-            const monthlyCounts = {};
-            orders.forEach(o => {
-                const date = new Date(o['Order Date']);
-                const key = date.toLocaleString('default', { month: 'short', year: '2-digit' });
-                monthlyCounts[key] = (monthlyCounts[key] || 0) + 1;
-            });
-            const sortedMonths = Object.keys(monthlyCounts).sort((a, b) => new Date('01 ' + a) - new Date('01 ' + b));
-
-            const trendCtx = document.getElementById('trendChart').getContext('2d');
-            charts['trendChart'] = new Chart(trendCtx, {
-                type: 'line',
-                data: {
-                    labels: sortedMonths,
-                    datasets: [{
-                        label: 'Orders',
-                        data: sortedMonths.map(m => monthlyCounts[m]),
-                        borderColor: '#059cf7',
-                        backgroundColor: 'rgba(5, 156, 247, 0.1)',
-                        fill: true,
-                        tension: 0.4
-                    }]
-                },
-                options: {
-                    plugins: {
-                        tooltip: {
-                            callbacks: {
-                                label: (context) => 'Order Count: ' + context.raw
-                            }
-                        }
-                    },
-                    scales: {
-                        y: { beginAtZero: true }
-                    }
-                }
-            });
-
-            // 5. Aging Balance (Overdue) - Count based
+            // 3. Aging Balance (Overdue) - Count based
             const agingBuckets = { '0-30 Days': { count: 0, amount: 0 }, '31-60 Days': { count: 0, amount: 0 }, '61-90 Days': { count: 0, amount: 0 }, '90+ Days': { count: 0, amount: 0 } };
 
             orders.forEach(o => {
@@ -432,13 +405,130 @@ document.addEventListener('DOMContentLoaded', () => {
                     }
                 }
             });
+        }
+
+        // Consumption, volume trend and top products come from server-side rollups
+        // so these charts don't need the raw order list.
+        let rollupRequest = 0;
+        let rollupTimer = null;
+        // Pushed changes that move the rollups: a burst of them costs one round of requests
+        function scheduleRollupCharts() {
+            clearTimeout(rollupTimer);
+            rollupTimer = setTimeout(renderRollupCharts, 250);
+        }
+
+        async function renderRollupCharts() {
+            clearTimeout(rollupTimer);
+            const requestId = ++rollupRequest;
+            const dateFilter = document.getElementById('dateFilter').value;
+            const filters = {
+                days: dateFilter !== 'all' ? parseInt(dateFilter) : null,
+                type: document.getElementById('typeFilter').value,
+                status: document.getElementById('statusFilter').value
+            };
+            const params = new URLSearchParams();
+            if (filters.days) {
+                const start = new Date();
+                start.setDate(start.getDate() - filters.days);
+                params.set('start', start.toISOString().slice(0, 10));
+            }
+            if (filters.type !== 'all') params.set('order_type', filters.type);
+            if (filters.status !== 'all') params.set('status', filters.status);
+            const rollup = (extra) => fetch(`/api/rollups?${params}&${extra}`).then(r => r.json());
+
+            let byType, monthly, topItems;
+            try {
+                [byType, monthly, topItems] = await Promise.all([
+                    rollup('group=order_type'),
+                    rollup('granularity=month'),
+                    rollup('group=item&top=5')
+                ]);
+            } catch (error) {
+                console.error('Error fetching rollups:', error);
+                return;
+            }
+            // A newer filter change already started its own request
+            if (requestId !== rollupRequest) return;
+
+            ['consumptionChart', 'trendChart', 'topProductsChart'].forEach(id => {
+                if (charts[id]) {
+                    charts[id].destroy();
+                }
+            });
+
+            // Consumption by Product Type
+            const typeCounts = {};
+            byType.totals.forEach(t => typeCounts[t.key] = t.revenue);
+
+            const consumptionCtx = document.getElementById('consumptionChart').getContext('2d');
+            charts['consumptionChart'] = new Chart(consumptionCtx, {
+                type: 'bar',
+                data: {
+                    labels: Object.keys(typeCounts),
+                    datasets: [{
+                        label: 'Total Amount',
+                        data: Object.values(typeCounts),
+                        backgroundColor: getGradient(consumptionCtx, '#003073', '#059cf7'),
+                        borderRadius: 5
+                    }]
+                },
+                options: {
+                    plugins: {
+                        legend: { display: false },
+                        tooltip: {
+                            callbacks: {
+                                label: (context) => formatIndianCurrency(context.raw)
+                            }
+                        }
+                    },
+                    scales: {
+                        y: {
+                            beginAtZero: true,
+                            ticks: { callback: (value) => formatCompactNumber(value) }
+                        }
+                    }
+                }
+            });
+
+            // Order Volume Trend (Monthly)
+            // Buckets arrive sorted by period from the server
+            const monthlyCounts = {};
+            monthly.buckets.forEach(b => {
+                const key = new Date(b.period + 'T00:00:00').toLocaleString('default', { month: 'short', year: '2-digit' });
+                monthlyCounts[key] = b.orders;
+            });
+            const sortedMonths = Object.keys(monthlyCounts);
+
+            const trendCtx = document.getElementById('trendChart').getContext('2d');
+            charts['trendChart'] = new Chart(trendCtx, {
+                type: 'line',
+                data: {
+                    labels: sortedMonths,
+                    datasets: [{
+                        label: 'Orders',
+                        data: sortedMonths.map(m => monthlyCounts[m]),
+                        borderColor: '#059cf7',
+                        backgroundColor: 'rgba(5, 156, 247, 0.1)',
+                        fill: true,
+                        tension: 0.4
+                    }]
+                },
+                options: {
+                    plugins: {
+                        tooltip: {
+                            callbacks: {
+                                label: (context) => 'Order Count: ' + context.raw
+                            }
+                        }
+                    },
+                    scales: {
+                        y: { beginAtZero: true }
+                    }
+                }
+            });
 
-            // 6. Top 5 Products
-            const productSales = {};
-            orders.forEach(o => productSales[o['Item']] = (productSales[o['Item']] || 0) + o['Total Amount']);
-            const topProducts = Object.entries(productSales)
-                .sort((a, b) => b[1] - a[1])
-                .slice(0, 5);
+            // Top 5 Products
+            const topProducts = topItems.totals.map(t => [t.key, t.revenue]);
 
             const topCtx = document.getElementById('topProductsChart').getContext('2d');
             charts['topProductsChart'] = new Chart(topCtx, {
@@ -565,7 +655,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const timeline = document.getElementById('trackingTimeline');
                 timeline.innerHTML = data.tracking.map(step => `
                     <div class="timeline-item ${step.completed ? 'completed' : ''}">
-                        <div class="timeline-date">${step.timestamp || 'Pending'}</div>
+                        <div class="timeline-date">${step.timestamp || (step.completed ? 'Completed' : 'Pending')}</div>
                         <div class="timeline-status">${step.status}</div>
                         <div class="timeline-location">${step.location}</div>
                     </div>
@@ -599,10 +689,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
                     if (data.success) {
                         closeModals();
+                        // The change feed delivers the updated row; no need to reload the page
                         showNotification("Order cancelled. We are sorry that we could not serve you to your satisfaction.");
-                        setTimeout(() => {
-                            location.reload();
-                        }, 3000);
                     } else {
                         alert('Failed to cancel order');
                     }
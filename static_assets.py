@@ -0,0 +1,83 @@
+import hashlib
+import os
+import threading
+
+from compression import brotli, compress, choose_encoding
+
+ASSET_EXTENSIONS = ('.css', '.js')
+ASSET_PREFIX = '/assets/'
+MEDIA_TYPES = {'.css': 'text/css; charset=utf-8', '.js': 'application/javascript; charset=utf-8'}
+# The URL changes whenever the content does, so browsers may keep a copy forever
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class StaticAssets:
+    # Content-hashed, precompressed copies of the CSS/JS in a directory, held in memory.
+    # Templates link to asset_url('style.css') -> /assets/style.3f9a1c2b7d4e.css; repeat
+    # page loads then come from the browser cache, and first loads cost no compression CPU.
+    # Files are re-read when their mtime changes, so edits show up without a restart.
+
+    def __init__(self, directory, prefix=ASSET_PREFIX):
+        self.directory = directory
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._assets = {}   # relative path -> (mtime, hashed name)
+        self._by_name = {}  # hashed name -> {encoding or None: bytes}, media type
+
+    def _load(self, path):
+        full_path = os.path.join(self.directory, path)
+        mtime = os.stat(full_path).st_mtime_ns
+        current = self._assets.get(path)
+        if current and current[0] == mtime:
+            return current[1]
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(path)
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        variants = {None: data, 'gzip': compress(data, 'gzip', best=True)}
+        if brotli is not None:
+            variants['br'] = compress(data, 'br', best=True)
+        if current:
+            self._by_name.pop(current[1], None)
+        self._by_name[name] = (variants, MEDIA_TYPES[ext])
+        self._assets[path] = (mtime, name)
+        return name
+
+    def url(self, path):
+        # Fingerprinted URL for a file under the directory; other files keep their plain /static URL
+        if not path.endswith(ASSET_EXTENSIONS):
+            return '/static/' + path
+        with self._lock:
+            try:
+                return self.prefix + self._load(path)
+            except OSError:
+                return '/static/' + path
+
+    def response(self, name, accept_encoding):
+        # (body, headers) for a hashed name, or None if it isn't (or is no longer) an asset
+        with self._lock:
+            asset = self._by_name.get(name)
+            if asset is None:
+                # Not linked from this process yet (another worker rendered the page):
+                # load the file the name points at and check the hash still matches
+                stem, ext = os.path.splitext(name)
+                path = os.path.normpath(os.path.splitext(stem)[0] + ext)
+                if path.endswith(ASSET_EXTENSIONS) and not path.startswith(('..', '/', '\\')):
+                    try:
+                        self._load(path)
+                    except OSError:
+                        pass
+                asset = self._by_name.get(name)
+        if asset is None:
+            return None
+        variants, media_type = asset
+        encoding = choose_encoding(accept_encoding)
+        headers = {
+            "Cache-Control": IMMUTABLE,
+            "Content-Type": media_type,
+            "ETag": f'"{name}-{encoding or "identity"}"',
+            "Vary": "Accept-Encoding"
+        }
+        if encoding is not None and encoding in variants:
+            headers["Content-Encoding"] = encoding
+        return variants.get(encoding, variants[None]), headers
@@ -0,0 +1,223 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+PROFILE_DIR = os.path.join('data', 'profiles')
+MAX_STORED_TRACES = 200
+
+# Per-thread active trace so agents can open spans without threading it through every call
+_local = threading.local()
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ('span_id', 'parent_id', 'name', 'start', 'end', 'thread_id', 'attrs')
+
+    def __init__(self, span_id, parent_id, name, attrs):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread_id = threading.get_ident()
+        self.attrs = dict(attrs)
+
+    @property
+    def duration_ms(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = dict(attrs)
+        self.created_at = time.time()
+        self.spans = []
+        self._stack = []
+        self._lock = threading.Lock()
+        self.root = self._open(name, attrs)
+
+    def _open(self, name, attrs):
+        with self._lock:
+            parent_id = self._stack[-1].span_id if self._stack else None
+            s = Span(len(self.spans) + 1, parent_id, name, attrs)
+            self.spans.append(s)
+            self._stack.append(s)
+        return s
+
+    def _close(self, s):
+        s.end = time.perf_counter()
+        with self._lock:
+            if s in self._stack:
+                self._stack.remove(s)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        s = self._open(name, attrs)
+        try:
+            yield s
+        except Exception as e:
+            s.attrs['error'] = str(e)
+            raise
+        finally:
+            self._close(s)
+
+    def finish(self):
+        if self.root.end is None:
+            self._close(self.root)
+
+    @property
+    def duration_ms(self):
+        return self.root.duration_ms
+
+    def to_dict(self):
+        origin = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "created_at": self.created_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "spans": [
+                {
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "name": s.name,
+                    "start_ms": round((s.start - origin) * 1000, 3),
+                    "duration_ms": round(s.duration_ms, 3),
+                    "attrs": s.attrs
+                }
+                for s in self.spans
+            ]
+        }
+
+    def to_chrome_trace(self):
+        # Chrome trace event format, loadable in chrome://tracing or Perfetto
+        origin = self.root.start
+        pid = os.getpid()
+        events = []
+        for s in self.spans:
+            events.append({
+                "name": s.name,
+                "cat": self.name,
+                "ph": "X",
+                "ts": round((s.start - origin) * 1e6, 1),
+                "dur": round(s.duration_ms * 1000, 1),
+                "pid": pid,
+                "tid": s.thread_id,
+                "args": {k: v if isinstance(v, (int, float, bool)) or v is None else str(v) for k, v in s.attrs.items()}
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": self.trace_id}}
+
+    def summary(self):
+        # Total time per span name, e.g. how much of a request went to LLM calls vs exec
+        totals = {}
+        for s in self.spans[1:]:
+            totals[s.name] = totals.get(s.name, 0) + s.duration_ms
+        return {name: round(ms, 1) for name, ms in totals.items()}
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def activate(trace):
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def span(name, **attrs):
+    trace = current_trace()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attrs) as s:
+        yield s
+
+
+def store_trace(trace):
+    with _traces_lock:
+        _traces[trace.trace_id] = trace
+        while len(_traces) > MAX_STORED_TRACES:
+            _traces.popitem(last=False)
+
+
+def get_trace(trace_id):
+    with _traces_lock:
+        return _traces.get(trace_id)
+
+
+def profiling_enabled(requested=False):
+    return requested or os.getenv('AGENT_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+
+def _prune_profiles():
+    # Keep the profile directory as bounded as the in-memory traces, dropping the oldest dumps
+    try:
+        paths = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)]
+        paths.sort(key=os.path.getmtime)
+    except OSError as e:
+        print(f"Could not list profiles in {PROFILE_DIR}: {e}")
+        return
+    for path in paths[:-MAX_STORED_TRACES]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Another worker may have pruned it already
+            pass
+
+
+@contextmanager
+def profile_request(trace, enabled=False):
+    # Opt-in per-request profiler. pyinstrument gives a readable call tree when installed,
+    # otherwise fall back to cProfile and dump pstats for snakeviz / pstats.Stats.
+    if not enabled:
+        yield None
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            path = os.path.join(PROFILE_DIR, f'{trace.trace_id}.html')
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+            trace.attrs['profile_path'] = path
+            _prune_profiles()
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        path = os.path.join(PROFILE_DIR, f'{trace.trace_id}.prof')
+        profiler.dump_stats(path)
+        trace.attrs['profile_path'] = path
+        _prune_profiles()
+        stats = pstats.Stats(profiler)
+        trace.attrs['profile_total_s'] = round(stats.total_tt, 4)
@@ -9,50 +9,93 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 from datetime import datetime
+from order_store import OrderStore, read_order_table, write_order_table, orders_to_records, orders_to_json
+from stage_events import StageEventStore, seed_events_from_orders, EVENT_COLUMNS, STAGE_LOCATIONS
+from config_cache import ConfigCache
+from receivables import ReceivablesIndex
 
 DATA_DIR = 'data'
 ORDER_DB_PATH = os.path.join(DATA_DIR, 'order_db_v2.xlsx')
 INVOICE_TEMPLATE_PATH = os.path.join(DATA_DIR, 'invoice_template.docx')
+CONFIG_PATH = 'config.json'
+DEFAULT_CONFIG = {"payment_due_days": 60}
+
+# Set by `app.py --workers N`; worker processes share the order table through snapshots and the journal
+WORKERS_ENV = 'ORDER_PORTAL_WORKERS'
+_order_store = None
+_order_listeners = []
+_stage_events = None
+_stage_events_key = None
+_config = ConfigCache(CONFIG_PATH, DEFAULT_CONFIG)
+
+def get_order_store():
+    # Re-created if ORDER_DB_PATH is repointed (e.g. by the benchmark suite) or multi-worker mode is switched on
+    global _order_store
+    shared = worker_count() > 1
+    if _order_store is None or _order_store.path != ORDER_DB_PATH or _order_store.snapshots != shared:
+        _order_store = OrderStore(ORDER_DB_PATH, snapshots=shared)
+        for listener in _order_listeners:
+            _order_store.subscribe(listener)
+    return _order_store
+
+def get_stage_events():
+    # One event store per order table; seeded from the dates the order table already records
+    global _stage_events, _stage_events_key
+    store = get_order_store()
+    key = (os.path.join(DATA_DIR, 'stage_events.csv'), id(store))
+    if _stage_events is None or _stage_events_key != key:
+        _stage_events = StageEventStore(key[0], PRODUCTION_STAGES, seed=lambda: seed_events_from_orders(store.frame))
+        _stage_events_key = key
+    return _stage_events
+
+def worker_count():
+    return int(os.environ.get(WORKERS_ENV, '1'))
+
+def subscribe_order_changes(listener):
+    # Survives the store being re-created for a different ORDER_DB_PATH
+    _order_listeners.append(listener)
+    if _order_store is not None:
+        _order_store.subscribe(listener)
 
 def get_orders_df():
-    if not os.path.exists(ORDER_DB_PATH):
-        return pd.DataFrame()
-    
-    df = pd.read_excel(ORDER_DB_PATH)
-    # Ensure consistency in column names (strip whitespace)
-    df.columns = [c.strip() for c in df.columns]
-    
-    # Convert dates to string for JSON serialization
-    if 'Order Date' in df.columns:
-        df['Order Date'] = pd.to_datetime(df['Order Date'])
-    if 'Expected Delivery' in df.columns:
-        df['Expected Delivery'] = pd.to_datetime(df['Expected Delivery'])
-    if 'Shipped Date' in df.columns:
-         df['Shipped Date'] = pd.to_datetime(df['Shipped Date'])
-    if 'Delivered Date' in df.columns:
-         df['Delivered Date'] = pd.to_datetime(df['Delivered Date'])
-    if 'Payment Due Date' in df.columns:
-         df['Payment Due Date'] = pd.to_datetime(df['Payment Due Date'])
-    if 'Expected Dispatch Date' in df.columns:
-         df['Expected Dispatch Date'] = pd.to_datetime(df['Expected Dispatch Date'])
-         
+    # Orders with party names only; addresses/GST/TIN stay in the buyer/seller tables.
+    # Copy so ad-hoc analysis (the AI executor) can't mutate the shared store.
+    # Balance and overdue state come precomputed, so the agent doesn't re-derive the rule.
+    store = get_order_store()
+    with store.lock:
+        df = store.joined(columns=['Buyer Name', 'Seller Name']).copy()
+        overdue, days = receivables.overdue_mask()
+    if not df.empty:
+        df['Balance'] = df['Total Amount'].fillna(0) - df['Advance Amount'].fillna(0)
+        df['Payment Overdue'] = overdue
+        df['Days Overdue'] = pd.Series(days, index=df.index).where(overdue)
     return df
 
-def get_production_timeline(status):
-    stages = [
-        "PO Received", 
-        "Film Extrusion", 
-        "Printing", 
-        "Lamination", 
-        "Slitting", 
-        "QC", 
-        "Dispatch", 
-        "Delivered"
-    ]
+def get_buyers_df():
+    return get_order_store().party_table('Buyer ID').copy()
+
+def get_sellers_df():
+    return get_order_store().party_table('Seller ID').copy()
+
+PRODUCTION_STAGES = [
+    "PO Received", 
+    "Film Extrusion", 
+    "Printing", 
+    "Lamination", 
+    "Slitting", 
+    "QC", 
+    "Dispatch", 
+    "Delivered"
+]
+
+def get_production_timeline(status, events=None):
+    # events: the order's stage-event history (see get_order_history), oldest first
+    stages = PRODUCTION_STAGES
     
     # Map status to index in stages
     status_map = {
         'Ordered': 0,
+        'PO Received': 0,
         'In Production': 1, # Generic start
         'Film Extrusion': 1,
         'Printing': 2,
@@ -60,6 +103,7 @@ def get_production_timeline(status):
         'Slitting': 4,
         'QC': 5,
         'Ready for Dispatch': 6,
+        'Dispatch': 6,
         'Shipped': 6, # Past dispatch
         'Delivered': 7,
         'Cancelled': -1
@@ -68,56 +112,140 @@ def get_production_timeline(status):
     current_index = status_map.get(status, 0)
     if status == 'Shipped':
         current_index = 6 # Mark Dispatch as done
+
+    # When each stage was first reached, and where
+    reached = {}
+    if events is not None:
+        for stage, ts, location in zip(events['stage'], events['timestamp'], events['location']):
+            reached.setdefault(stage, (ts, location))
         
     timeline = []
     for i, stage in enumerate(stages):
+        ts, location = reached.get(stage, (None, None))
         timeline.append({
             "stage": stage,
             "completed": i <= current_index if current_index != -1 else False,
-            "current": i == current_index if current_index != -1 else False
+            "current": i == current_index if current_index != -1 else False,
+            "timestamp": ts.strftime('%Y-%m-%d %H:%M') if ts is not None else None,
+            "location": location
         })
         
     return timeline
 
 def get_all_orders():
-    df = get_orders_df()
-    if df.empty:
-        return []
-        
-    # Convert timestamps to strings for JSON serialization
-    for col in df.select_dtypes(include=['datetime64']).columns:
-        df[col] = df[col].astype(str).replace('NaT', None)
-        
-    # Fill NaN with empty string or 0
-    df = df.fillna('')
-        
-    return df.to_dict('records')
+    return orders_to_records(get_order_store().joined())
+
+def get_all_orders_json():
+    # Serialized straight from the typed frame, skipping per-row dicts
+    return orders_to_json(get_order_store().joined())
 
 def load_config():
-    config_path = 'config.json'
-    if os.path.exists(config_path):
-        with open(config_path, 'r') as f:
-            return json.load(f)
-    return {"payment_due_days": 60}
+    # Cached; edits to config.json are picked up within a second without a restart
+    return _config.get()
+
+# Overdue / aging queries over a due-date index, shared by the API, dashboard stats and the AI agent
+receivables = ReceivablesIndex(get_order_store, load_config)
 
 def get_order_by_id(order_id):
-    orders = get_all_orders()
-    for order in orders:
-        if order['Order No'] == order_id:
-            return order
-    return None
+    return get_order_store().get(order_id)
+
+def get_orders_by_ids(order_ids):
+    store = get_order_store()
+    return orders_to_records(store.joined(store.select(order_ids)))
 
 def cancel_order(order_id, reason):
-    if not os.path.exists(ORDER_DB_PATH):
-        return False
-    
-    df = pd.read_excel(ORDER_DB_PATH)
-    if order_id in df['Order No'].values:
-        df.loc[df['Order No'] == order_id, 'Order Status'] = 'Cancelled'
-        # In a real app, we would store the cancellation reason somewhere
-        df.to_excel(ORDER_DB_PATH, index=False)
-        return True
-    return False
+    # Journaled immediately; the table file is rewritten later by the store's compaction
+    # Cancelling an already cancelled order succeeds without changing anything
+    result = get_order_store().update_status([order_id], 'Cancelled', reason=reason)
+    return bool(result['updated'] or result['unchanged'])
+
+def update_order_status(order_ids, status):
+    # Bulk move between production stages; cancelled and delivered orders stay where they are
+    if status not in PRODUCTION_STAGES:
+        raise ValueError(f"Unknown production stage: {status}")
+    return get_order_store().update_status(order_ids, status, skip_statuses=('Cancelled', 'Delivered'))
+
+def get_order_history(order_id):
+    return get_stage_events().history(order_id)
+
+def ingest_stage_events(events):
+    # Bulk feed from floor scanners / MES: [{order_no, stage, timestamp, location}, ...].
+    # Valid events are stored; orders whose newest event moved them to a new stage get that status.
+    df = pd.DataFrame(list(events), columns=EVENT_COLUMNS)
+    store = get_order_store()
+    df['order_no'] = df['order_no'].astype(str)
+    ts = pd.to_datetime(df['timestamp'], errors='coerce', format='mixed')
+
+    reasons = pd.Series(None, index=df.index, dtype=object)
+    reasons[~df['order_no'].isin(store.frame['Order No'].astype(str))] = 'unknown order'
+    reasons[ts.isna()] = 'invalid timestamp'
+    reasons[~df['stage'].isin(PRODUCTION_STAGES)] = 'unknown stage'
+    valid = reasons.isna()
+    rejected = [{"index": int(i), "reason": reason} for i, reason in reasons[~valid].items()]
+
+    advanced = get_stage_events().ingest(df[valid].assign(timestamp=ts[valid]))
+
+    updated = []
+    if advanced:
+        rows = store.select(list(advanced))
+        current = dict(zip(rows['Order No'].astype(str), rows['Order Status'].astype(str)))
+        by_stage = {}
+        rank = {stage: i for i, stage in enumerate(PRODUCTION_STAGES)}
+        for order_no, stage in advanced.items():
+            # Feeds only move orders forward; a late scan from an earlier stage doesn't roll the status back
+            if rank[stage] > rank.get(current.get(order_no), -1):
+                by_stage.setdefault(stage, []).append(order_no)
+        for stage, order_ids in by_stage.items():
+            result = store.update_status(order_ids, stage, skip_statuses=('Cancelled',), source='stage_events')
+            updated.extend(result['updated'])
+
+    return {"ingested": int(valid.sum()), "rejected": rejected, "status_updated": updated}
+
+def _record_status_events(entry):
+    # Stage moves made through the portal are events too, so timelines stay complete
+    # Mutations replayed from another worker were already recorded by that worker
+    if entry.get('op') != 'set_status' or entry.get('source') == 'stage_events' or entry.get('replayed') or entry['status'] not in PRODUCTION_STAGES:
+        return
+    events = pd.DataFrame({'order_no': entry['order_ids'], 'stage': entry['status'], 'timestamp': entry['ts'], 'location': None})
+    get_stage_events().ingest(events)
+
+subscribe_order_changes(_record_status_events)
+subscribe_order_changes(receivables.on_mutation)
+
+def get_dashboard_stats():
+    df = get_order_store().frame
+    if df.empty:
+        return {
+            "total_orders": 0,
+            "status_counts": {},
+            "financials": {"revenue": 0, "advance": 0, "outstanding": 0},
+            "avg_transit_time": 0,
+            "overdue_count": 0
+        }
+
+    status_counts = df['Order Status'].value_counts(sort=False)
+    status_counts = {str(k): int(v) for k, v in status_counts.items() if v > 0}
+
+    amount = df['Total Amount'].fillna(0)
+    advance = df['Advance Amount'].fillna(0)
+    balance = amount - advance
+    owing = balance > 0
+
+    delivered = df['Order Status'] == 'Delivered'
+    transit = (df['Delivered Date'] - df['Shipped Date'])[delivered].dropna().dt.days
+    avg_transit_time = float(transit.mean()) if len(transit) else 0
+
+    return {
+        "total_orders": len(df),
+        "status_counts": status_counts,
+        "financials": {
+            "revenue": amount.sum().item(),
+            "advance": float(advance.sum()),
+            "outstanding": float(balance[owing].sum())
+        },
+        "avg_transit_time": round(avg_transit_time, 1),
+        "overdue_count": receivables.summary()["overdue_count"]
+    }
 
 def generate_invoice_docx(order_id):
     order = get_order_by_id(order_id)